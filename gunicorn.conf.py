@@ -0,0 +1,26 @@
+# Production launcher: gunicorn -c gunicorn.conf.py main:app
+# Gunicorn supervises the uvicorn worker processes and restarts any that die.
+import os
+
+# Same default as python main.py; deploy/nginx.conf proxies to 127.0.0.1:8000
+bind = f"{os.getenv('HOST', '127.0.0.1')}:{os.getenv('PORT', '8000')}"
+
+# One worker unless WEB_CONCURRENCY says otherwise. User API keys, session state, the caches and
+# the LLM/Murf clients live in each worker's memory, so more than one worker needs sticky sessions
+# at the load balancer or requests land on a worker that doesn't know the user's keys or session
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+# UvicornWorker running on uvloop + httptools (both come with uvicorn[standard] on Linux/macOS)
+worker_class = "utils.gunicorn_worker.UvloopHttptoolsWorker"
+
+# Voice turns (STT -> LLM -> TTS) and WebSocket sessions are long-lived
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Load the app once in the master so workers fork with it already imported.
+# Safe because MongoDB and HTTP clients are only created in the startup hook, i.e. per worker after fork
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
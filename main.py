@@ -1,23 +1,32 @@
-from fastapi import FastAPI, Request, UploadFile, File, Path, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Path, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import os
+import base64
 import uuid
 import uvicorn
-import json
+import orjson
 import asyncio
+import functools
 import re
 import tempfile
+import time
+import httpx
+import jinja2
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-from dotenv import load_dotenv
+from typing import Optional, Union
 
 from models.schemas import (
     ChatHistoryResponse, 
     BackendStatusResponse,
     APIKeyConfig,
     WebSearchResponse,
-    WebSearchResult
+    ErrorType
 )
 from services.stt_service import STTService
 from services.llm_service import LLMService
@@ -27,23 +36,58 @@ from services.assemblyai_streaming_service import AssemblyAIStreamingService
 from services.murf_websocket_service import MurfWebSocketService
 from services.web_search_service import WebSearchService
 from utils.logging_config import setup_logging, get_logger
+from utils.cache import TTLCache
+from utils.constants import HISTORY_CONTEXT_LIMIT, get_fallback_message
+from utils.settings import settings
+from utils.middleware import MaxBodySizeMiddleware
+from utils.file_writer import BackgroundFileWriter
+from utils.streaming import PrefetchedStream
+from utils.ws_messages import tts_audio_frame
 
 
-# Load environment variables
-load_dotenv()
 setup_logging()
 logger = get_logger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run startup before the first request and shutdown after the last one"""
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="VoxMate - AI Voice Agent",
     description="A modern conversational AI voice agent with FastAPI backend",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serialises the dict/model responses several times faster than stdlib json
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# Compress larger HTTP responses (chat history JSON, pages, app.js); WebSocket traffic is untouched
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Refuse oversized uploads from their Content-Length header, before the body is buffered
+app.add_middleware(MaxBodySizeMiddleware, max_bytes=settings.max_upload_bytes)
+
 # Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+# Set SERVE_STATIC=false when a reverse proxy (see deploy/nginx.conf) serves /static directly
+if settings.serve_static:
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+# Templates ship with the app, so skip per-render mtime checks and keep compiled bytecode across restarts
+templates = Jinja2Templates(
+    directory="templates",
+    auto_reload=False,
+    bytecode_cache=jinja2.FileSystemBytecodeCache()
+)
+# The welcome page has no per-request values, so render it once and serve the same bytes every time
+WELCOME_PAGE_HTML = templates.get_template("welcome.html").render().encode("utf-8")
+# The chat page only varies by session_id; keep the compiled template and render it directly
+CHAT_PAGE_TEMPLATE = templates.get_template("index.html")
+
 stt_service: STTService = None
 llm_service: LLMService = None
 tts_service: TTSService = None
@@ -61,14 +105,16 @@ def initialize_services() -> APIKeyConfig:
         assemblyai_api_key="",  # Empty by default
         murf_api_key="",  # Empty by default
         murf_voice_id="en-IN-aarav",  # Default voice
-        mongodb_url=os.getenv("MONGODB_URL"),  # Database URL still from .env
+        mongodb_url=settings.mongodb_url,  # Database URL still from .env
         tavily_api_key=""  # Empty by default
     )
     
     global stt_service, llm_service, tts_service, database_service, assemblyai_streaming_service, murf_websocket_service, web_search_service
     
-    # Only initialize database service - AI services require user keys
-    database_service = DatabaseService(config.mongodb_url)
+    # Only initialize database service - AI services require user keys.
+    # Created once per process: a repeated startup must not open a second MongoDB pool
+    if database_service is None:
+        database_service = DatabaseService(config.mongodb_url)
     
     # Set all AI services to None initially
     stt_service = None
@@ -83,13 +129,43 @@ def initialize_services() -> APIKeyConfig:
     return config
 
 
-@app.on_event("startup")
+# Provider hosts reached through the shared HTTP client; any cheap GET opens a pooled connection
+WARMUP_URLS = (
+    "https://api.murf.ai/",
+    "https://api.assemblyai.com/v2/",
+    "https://api.tavily.com/",
+    "https://generativelanguage.googleapis.com/",
+)
+
+
+async def warm_up_http_connections(client: httpx.AsyncClient):
+    """Pre-open keep-alive connections to upstream APIs, ignoring the responses"""
+    async def probe(url: str):
+        try:
+            await client.get(url, timeout=5.0)
+        except Exception as e:
+            logger.debug(f"Connection warm-up to {url} failed: {e}")
+    
+    await asyncio.gather(*(probe(url) for url in WARMUP_URLS))
+    logger.info("[WARMUP] Upstream HTTP connections pre-opened")
+
+
 async def startup_event():
     logger.info("[START] Starting Voice Agent application...")
     
     # Clean up old temporary audio files from previous sessions
     cleanup_old_temp_audio_files()
     
+    # Shared, pooled HTTP client for outbound REST calls (Murf, AssemblyAI, ...);
+    # HTTP/2 multiplexes concurrent requests to one provider over a single TLS connection
+    app.state.http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=60.0)
+    )
+    # Open TCP+TLS to each provider in the background so the first user request skips the handshake
+    run_in_background(warm_up_http_connections(app.state.http_client), "HTTP connection warm-up")
+    
     config = initialize_services()
     if database_service:
         try:
@@ -109,6 +185,7 @@ async def startup_event():
             try:
                 await asyncio.sleep(30)  # Check every 30 seconds
                 await safety_reset_stuck_sessions()
+                evict_idle_sessions()
             except Exception as e:
                 logger.error(f"Error in periodic safety cleanup: {e}")
     
@@ -118,11 +195,19 @@ async def startup_event():
     logger.info("[SUCCESS] Application startup completed")
 
 
-@app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on application shutdown"""
     logger.info("[STOP] Shutting down Voice Agent application...")
     
+    # Let in-flight history writes land before the database connection goes away
+    if background_tasks:
+        logger.info(f"[STOP] Waiting for {len(background_tasks)} background tasks to finish...")
+        done, pending = await asyncio.wait(list(background_tasks), timeout=BACKGROUND_DRAIN_TIMEOUT)
+        if pending:
+            logger.warning(f"[WARNING] {len(pending)} background tasks still running after {BACKGROUND_DRAIN_TIMEOUT:.0f}s; cancelling")
+            for task in pending:
+                task.cancel()
+    
     if database_service:
         await database_service.close()
     
@@ -130,13 +215,15 @@ async def shutdown_event():
     if murf_websocket_service and murf_websocket_service.is_connected:
         await murf_websocket_service.disconnect()
     
+    await app.state.http_client.aclose()
+    
     logger.info("[SUCCESS] Application shutdown completed")
 
 
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request):
+async def home():
     """Serve the welcome page"""
-    return templates.TemplateResponse("welcome.html", {"request": request})
+    return HTMLResponse(WELCOME_PAGE_HTML)
 
 
 @app.get("/chat", response_class=HTMLResponse)
@@ -146,10 +233,7 @@ async def chat(request: Request):
     if not session_id:
         session_id = str(uuid.uuid4())
     
-    return templates.TemplateResponse("index.html", {
-        "request": request, 
-        "session_id": session_id
-    })
+    return HTMLResponse(CHAT_PAGE_TEMPLATE.render(session_id=session_id))
 
 
 @app.get("/api/backend", response_model=BackendStatusResponse)
@@ -159,9 +243,11 @@ async def get_backend_status():
         db_connected = database_service.is_connected() if database_service else False
         db_test_result = await database_service.test_connection() if database_service else False
         
-        return BackendStatusResponse(
-            status="healthy",
-            services={
+        # Built as a plain dict and returned as a Response, so FastAPI doesn't validate
+        # a BackendStatusResponse and then re-validate it against response_model
+        return ORJSONResponse({
+            "status": "healthy",
+            "services": {
                 "stt": stt_service is not None,
                 "llm": llm_service is not None,
                 "tts": tts_service is not None,
@@ -172,8 +258,8 @@ async def get_backend_status():
                 "murf_websocket": murf_websocket_service is not None,
                 "web_search": web_search_service is not None and web_search_service.is_configured()
             },
-            timestamp=datetime.now().isoformat()
-        )
+            "timestamp": datetime.now().isoformat()
+        })
     except Exception as e:
         logger.error(f"Error getting backend status: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -205,20 +291,25 @@ async def get_chat_history_endpoint(session_id: str = Path(..., description="Ses
     """Get chat history for a session"""
     try:
         chat_history = await database_service.get_chat_history(session_id)
-        return ChatHistoryResponse(
-            success=True,
-            session_id=session_id,
-            messages=chat_history,
-            message_count=len(chat_history)
-        )
+        # Stored messages already have the ChatMessage shape; let orjson encode them (datetimes
+        # included) directly instead of validating every message into a model and back
+        return ORJSONResponse({
+            "success": True,
+            "session_id": session_id,
+            "messages": [
+                {"role": msg["role"], "content": msg["content"], "timestamp": msg.get("timestamp")}
+                for msg in chat_history
+            ],
+            "message_count": len(chat_history)
+        })
     except Exception as e:
         logger.error(f"Error getting chat history for session {session_id}: {str(e)}")
-        return ChatHistoryResponse(
-            success=False,
-            session_id=session_id,
-            messages=[],
-            message_count=0
-        )
+        return ORJSONResponse({
+            "success": False,
+            "session_id": session_id,
+            "messages": [],
+            "message_count": 0
+        })
 
 
 
@@ -237,56 +328,87 @@ async def clear_session_history(session_id: str = Path(..., description="Session
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+def web_search_error_response(query: str, error_message: str) -> ORJSONResponse:
+    """Failed /api/web-search result, without building and re-validating a WebSearchResponse"""
+    return ORJSONResponse({
+        "success": False,
+        "query": query,
+        "results": [],
+        "error_message": error_message
+    })
+
+
 @app.post("/api/web-search", response_model=WebSearchResponse)
 async def search_web_endpoint(request: Request):
     """Search the web using Tavily API"""
     try:
-        body = await request.json()
+        # Parse with orjson rather than Starlette's stdlib-json request.json()
+        body = orjson.loads(await request.body())
         query = body.get("query", "")
         
         if not query.strip():
-            return WebSearchResponse(
-                success=False,
-                query=query,
-                results=[],
-                error_message="Search query cannot be empty"
-            )
+            return web_search_error_response(query, "Search query cannot be empty")
         
         if not web_search_service or not web_search_service.is_configured():
-            return WebSearchResponse(
-                success=False,
-                query=query,
-                results=[],
-                error_message="Web search service is not available. Please check Tavily API key."
-            )
+            return web_search_error_response(query, "Web search service is not available. Please check Tavily API key.")
         
         # Perform web search
         search_results = await web_search_service.search_web(query, max_results=3)
         
-        # Convert to response format
+        # Shape the results as WebSearchResult dicts; returning a Response skips a second
+        # validation pass against response_model
         web_results = [
-            WebSearchResult(
-                title=result["title"],
-                snippet=result["snippet"],
-                url=result["url"]
-            )
+            {"title": result["title"], "snippet": result["snippet"], "url": result["url"]}
             for result in search_results
         ]
         
-        return WebSearchResponse(
-            success=True,
-            query=query,
-            results=web_results
-        )
+        return ORJSONResponse({
+            "success": True,
+            "query": query,
+            "results": web_results,
+            "error_message": None
+        })
         
     except Exception as e:
         logger.error(f"Web search error: {str(e)}")
-        return WebSearchResponse(
-            success=False,
-            query=body.get("query", "") if 'body' in locals() else "",
-            results=[],
-            error_message=str(e)
-        )
+        return web_search_error_response(body.get("query", "") if 'body' in locals() else "", str(e))
+
+
+# Fixed per-key validation outcomes, shared instead of rebuilt for every key on every request
+KEY_VALID_RESULT = {"valid": True, "message": "Valid"}
+KEY_REQUIRED_RESULT = {"valid": False, "message": "API key required"}
+
+# Keys are checked with one cheap authenticated GET (Gemini's model list, AssemblyAI's transcript
+# list) instead of real work; definitive answers are cached so repeated validations don't go back out
+GEMINI_MODELS_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+ASSEMBLYAI_TRANSCRIPTS_URL = "https://api.assemblyai.com/v2/transcript"
+_key_check_results = TTLCache(maxsize=256, ttl=10 * 60)
+
+
+async def check_api_key(provider: str, api_key: str, url: str, **request_kwargs) -> dict:
+    cached = _key_check_results.get((provider, api_key))
+    if cached is not None:
+        return cached
+    
+    response = await app.state.http_client.get(url, **request_kwargs)
+    if response.status_code == 200:
+        result = KEY_VALID_RESULT
+    else:
+        result = {"valid": False, "message": f"Invalid: {provider} returned HTTP {response.status_code}"}
+    
+    # Rate limits and server errors say nothing about the key, so only cache clear verdicts
+    if response.status_code in (200, 400, 401, 403):
+        _key_check_results.set((provider, api_key), result)
+    return result
+
+
+async def check_gemini_key(api_key: str) -> dict:
+    # Key in the header rather than ?key=, since httpx logs the full request URL at INFO
+    return await check_api_key("Gemini", api_key, GEMINI_MODELS_URL, params={"pageSize": 1}, headers={"x-goog-api-key": api_key})
+
+
+async def check_assemblyai_key(api_key: str) -> dict:
+    return await check_api_key("AssemblyAI", api_key, ASSEMBLYAI_TRANSCRIPTS_URL, params={"limit": 1}, headers={"authorization": api_key})
 
 
 @app.post("/api/validate-keys")
@@ -298,40 +420,38 @@ async def validate_api_keys(keys: APIKeyConfig):
         # Test Gemini API key
         if keys.gemini_api_key:
             try:
-                test_llm = LLMService(keys.gemini_api_key)
-                test_response = await test_llm.get_response("test", "developer", web_search_enabled=False)
-                validation_results["gemini"] = {"valid": True, "message": "Valid"}
+                # No LLMService here: its genai.configure() would switch the live service to this key
+                validation_results["gemini"] = await check_gemini_key(keys.gemini_api_key)
             except Exception as e:
                 validation_results["gemini"] = {"valid": False, "message": f"Invalid: {str(e)[:100]}"}
         else:
-            validation_results["gemini"] = {"valid": False, "message": "API key required"}
+            validation_results["gemini"] = KEY_REQUIRED_RESULT
         
         # Test AssemblyAI API key
         if keys.assemblyai_api_key:
             try:
-                test_stt = STTService(keys.assemblyai_api_key)
-                # Simple validation - just check if the key format is correct
-                validation_results["assemblyai"] = {"valid": True, "message": "Valid"}
+                # No STTService here: it would overwrite the SDK's global API key
+                validation_results["assemblyai"] = await check_assemblyai_key(keys.assemblyai_api_key)
             except Exception as e:
                 validation_results["assemblyai"] = {"valid": False, "message": f"Invalid: {str(e)[:100]}"}
         else:
-            validation_results["assemblyai"] = {"valid": False, "message": "API key required"}
+            validation_results["assemblyai"] = KEY_REQUIRED_RESULT
         
         # Test MURF API key
         if keys.murf_api_key:
             try:
-                test_tts = TTSService(keys.murf_api_key, keys.murf_voice_id or "en-IN-aarav")
-                validation_results["murf"] = {"valid": True, "message": "Valid"}
+                test_tts = TTSService(keys.murf_api_key, keys.murf_voice_id or "en-IN-aarav", app.state.http_client)
+                validation_results["murf"] = KEY_VALID_RESULT
             except Exception as e:
                 validation_results["murf"] = {"valid": False, "message": f"Invalid: {str(e)[:100]}"}
         else:
-            validation_results["murf"] = {"valid": False, "message": "API key required"}
+            validation_results["murf"] = KEY_REQUIRED_RESULT
         
         # Test Tavily API key (optional)
         if keys.tavily_api_key:
             try:
-                test_search = WebSearchService(keys.tavily_api_key)
-                validation_results["tavily"] = {"valid": True, "message": "Valid"}
+                test_search = WebSearchService(keys.tavily_api_key, app.state.http_client)
+                validation_results["tavily"] = KEY_VALID_RESULT
             except Exception as e:
                 validation_results["tavily"] = {"valid": False, "message": f"Invalid: {str(e)[:100]}"}
         else:
@@ -365,8 +485,12 @@ def reinitialize_services_with_user_keys(user_keys: APIKeyConfig):
         if user_keys.gemini_api_key:
             total_services += 1
             try:
-                llm_service = LLMService(user_keys.gemini_api_key)
-                logger.info("[SUCCESS] LLM service reinitialized with user key")
+                # Keep the configured Gemini model when the key hasn't changed
+                if llm_service and llm_service.api_key == user_keys.gemini_api_key:
+                    logger.info("[SUCCESS] LLM service key unchanged, reusing existing client")
+                else:
+                    llm_service = LLMService(user_keys.gemini_api_key)
+                    logger.info("[SUCCESS] LLM service reinitialized with user key")
                 success_count += 1
             except Exception as e:
                 logger.error(f"Failed to reinitialize LLM service: {str(e)}")
@@ -374,9 +498,13 @@ def reinitialize_services_with_user_keys(user_keys: APIKeyConfig):
         if user_keys.assemblyai_api_key:
             total_services += 1
             try:
-                stt_service = STTService(user_keys.assemblyai_api_key)
-                assemblyai_streaming_service = AssemblyAIStreamingService(user_keys.assemblyai_api_key)
-                logger.info("[SUCCESS] STT and streaming services reinitialized with user key")
+                if (stt_service and assemblyai_streaming_service and
+                        stt_service.api_key == user_keys.assemblyai_api_key):
+                    logger.info("[SUCCESS] AssemblyAI key unchanged, reusing existing STT and streaming services")
+                else:
+                    stt_service = STTService(user_keys.assemblyai_api_key)
+                    assemblyai_streaming_service = AssemblyAIStreamingService(user_keys.assemblyai_api_key)
+                    logger.info("[SUCCESS] STT and streaming services reinitialized with user key")
                 success_count += 1
             except Exception as e:
                 logger.error(f"Failed to reinitialize STT/Streaming services: {str(e)}")
@@ -385,10 +513,17 @@ def reinitialize_services_with_user_keys(user_keys: APIKeyConfig):
             total_services += 1
             try:
                 voice_id = user_keys.murf_voice_id or "en-IN-aarav"
-                tts_service = TTSService(user_keys.murf_api_key, voice_id)
-                murf_websocket_service = MurfWebSocketService(user_keys.murf_api_key, voice_id)
-                # Note: Timeout configuration is handled internally by MurfWebSocketService
-                logger.info("[SUCCESS] TTS and WebSocket services reinitialized with user key")
+                # Reusing the services keeps the open Murf WebSocket and its HTTP client alive
+                if (tts_service and murf_websocket_service and
+                        tts_service.api_key == user_keys.murf_api_key and
+                        tts_service.voice_id == voice_id):
+                    logger.info("[SUCCESS] Murf key and voice unchanged, reusing existing TTS and WebSocket services")
+                else:
+                    tts_service = TTSService(user_keys.murf_api_key, voice_id, app.state.http_client)
+                    tts_service.start_fallback_pregeneration()
+                    murf_websocket_service = MurfWebSocketService(user_keys.murf_api_key, voice_id)
+                    # Note: Timeout configuration is handled internally by MurfWebSocketService
+                    logger.info("[SUCCESS] TTS and WebSocket services reinitialized with user key")
                 success_count += 1
             except Exception as e:
                 logger.error(f"Failed to reinitialize TTS/WebSocket services: {str(e)}")
@@ -396,8 +531,11 @@ def reinitialize_services_with_user_keys(user_keys: APIKeyConfig):
         if user_keys.tavily_api_key:
             total_services += 1
             try:
-                web_search_service = WebSearchService(user_keys.tavily_api_key)
-                logger.info("[SUCCESS] Web search service reinitialized with user key")
+                if web_search_service and web_search_service.api_key == user_keys.tavily_api_key:
+                    logger.info("[SUCCESS] Tavily key unchanged, reusing existing web search service")
+                else:
+                    web_search_service = WebSearchService(user_keys.tavily_api_key, app.state.http_client)
+                    logger.info("[SUCCESS] Web search service reinitialized with user key")
                 success_count += 1
             except Exception as e:
                 logger.error(f"Failed to reinitialize Web search service: {str(e)}")
@@ -411,57 +549,87 @@ def reinitialize_services_with_user_keys(user_keys: APIKeyConfig):
 
 
         
+# A client that can't take a frame within this long is treated as gone rather than stalling its pipeline
+WS_SEND_TIMEOUT = 10.0
+
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: list[WebSocket] = []
+        # A set makes membership checks and removals O(1) however many sockets are open
+        self.active_connections: set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+        self.active_connections.add(websocket)
+        websocket.state.alive = True
+        logger.info("WebSocket connected. Total connections: %s", len(self.active_connections))
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        self.active_connections.discard(websocket)
+        websocket.state.alive = False
+        logger.info("WebSocket disconnected. Total connections: %s", len(self.active_connections))
     
     def is_connected(self, websocket: WebSocket) -> bool:
         """Check if a WebSocket is still in active connections"""
-        return websocket in self.active_connections
+        # A flag on the socket itself; checked for every transcript and streamed chunk
+        return getattr(websocket.state, "alive", False)
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, message: Union[bytes, str], websocket: WebSocket):
         if self.is_connected(websocket):
             try:
-                await websocket.send_text(message)
+                # bytes go out as binary frames, which skip the UTF-8 handling text frames get
+                send = websocket.send_bytes if isinstance(message, bytes) else websocket.send_text
+                await asyncio.wait_for(send(message), timeout=WS_SEND_TIMEOUT)
             except Exception as e:
-                logger.error(f"Error sending personal message: {e}")
+                logger.error("Error sending personal message: %s", repr(e))
                 # Remove from active connections immediately on send error
-                if websocket in self.active_connections:
-                    self.active_connections.remove(websocket)
+                self.active_connections.discard(websocket)
+                websocket.state.alive = False
         else:
             logger.debug("Attempted to send message to disconnected WebSocket")
 
+    async def send_json(self, data: dict, websocket: WebSocket):
+        """Serialise with orjson (datetimes included) and send the UTF-8 JSON as a binary frame"""
+        await self.send_personal_message(orjson.dumps(data), websocket)
+
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to WebSocket: {e}")
+        # Send to everyone concurrently so one slow client doesn't hold up the rest;
+        # the snapshot is needed because failed connections are removed afterwards
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(connection.send_text(message), timeout=WS_SEND_TIMEOUT) for connection in connections),
+            return_exceptions=True
+        )
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error("Error broadcasting to WebSocket: %s", repr(result))
                 self.disconnect(connection)
 
 
 manager = ConnectionManager()
 
-# Global locks to prevent concurrent LLM streaming for the same session
-session_locks = {}
-# Track which sessions are currently processing to prevent overlaps
-session_processing = {}
-# Track if persona changed during processing to allow force processing
-session_persona_changed = {}
-# Track session to context mapping for cleanup
-session_contexts = {}
-# Track web search enabled status per session
-session_web_search = {}
+@dataclass
+class SessionState:
+    """Per-session flags that are read together on every turn"""
+    # Prevents concurrent LLM streaming for the same session
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Session is currently processing a query
+    processing: bool = False
+    # Persona changed during processing, so the next turn may force processing
+    persona_changed: bool = False
+    # Murf context bound to this session, cleared when switching sessions
+    context: Optional[str] = None
+    web_search: bool = False
+    # time.monotonic() of the last access, for idle eviction
+    last_seen: float = 0.0
+
+
+# Sessions untouched for this long are dropped by the periodic cleanup
+SESSION_IDLE_TTL = 30 * 60
+# Hard cap on tracked sessions; past it the least recently used idle ones are dropped straight away
+MAX_TRACKED_SESSIONS = 10_000
+# Least recently used first, so eviction only ever looks at the front
+sessions: "OrderedDict[str, SessionState]" = OrderedDict()
 # Track last processed transcript per session for duplicate detection
 session_last_transcript = {}
 # Track last processing time per session
@@ -470,6 +638,10 @@ session_last_time = {}
 session_last_persona = {}
 # Track active TTS tasks for cancellation
 active_tts_tasks = {}
+# Track in-flight LLM + TTS turns started from transcripts, so a disconnect can cancel them
+session_tasks = {}
+# Open /ws/audio-stream connections per session; their settings must survive idle eviction
+connected_sessions = Counter()
 # Track session responses for fallback TTS (prevent reusing previous responses)
 session_responses = {}
 # Track session query queues for processing multiple queries
@@ -486,13 +658,91 @@ session_tts_completed = {}
 session_response_ids = {}
 # Track active TTS processing to prevent concurrent starts (RULE 1)
 session_tts_active = {}
-
+# LLM text is relayed to the client once this many characters or seconds have accumulated
+LLM_CHUNK_FLUSH_CHARS = 64
+LLM_CHUNK_FLUSH_INTERVAL = 0.032
+# Chunk frames waiting for a slow client before further text is held back and merged
+LLM_CLIENT_QUEUE_SIZE = 64
+# Upper bound on the PCM bytes merged into one binary audio frame
+TTS_AUDIO_BATCH_MAX_BYTES = 256 * 1024
+# Fire-and-forget work (history writes) kept referenced until done so it isn't garbage collected
+background_tasks = set()
+# How long shutdown waits for background_tasks before cancelling the rest
+BACKGROUND_DRAIN_TIMEOUT = 10.0
+
+
+def run_in_background(coro, description: str) -> asyncio.Task:
+    """Schedule work off the response path; failures are logged instead of being lost"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    
+    def _on_done(done_task: asyncio.Task):
+        background_tasks.discard(done_task)
+        if not done_task.cancelled() and done_task.exception() is not None:
+            logger.error(f"Background task failed ({description}): {done_task.exception()}")
+    
+    task.add_done_callback(_on_done)
+    return task
+
+def get_session_state(session_id: str) -> SessionState:
+    """Return the session's state, creating it on first use"""
+    state = sessions.get(session_id)
+    if state is None:
+        state = sessions[session_id] = SessionState()
+        if len(sessions) > MAX_TRACKED_SESSIONS:
+            evict_sessions(len(sessions) - MAX_TRACKED_SESSIONS)
+    else:
+        sessions.move_to_end(session_id)
+    state.last_seen = time.monotonic()
+    return state
+
+def forget_session(session_id: str):
+    """Drop everything tracked for a session"""
+    sessions.pop(session_id, None)
+    for tracking in (session_last_transcript, session_last_time, session_last_persona, session_responses,
+                     session_queues, session_current_query, session_response_played, session_buffer_cleared,
+                     session_tts_completed, session_response_ids, session_tts_active):
+        tracking.pop(session_id, None)
+
+def evict_sessions(count: int, idle_before: Optional[float] = None) -> int:
+    """Forget up to `count` least recently used sessions, skipping busy or connected ones; returns how many went"""
+    evicted = []
+    for session_id, state in sessions.items():
+        if len(evicted) >= count or (idle_before is not None and state.last_seen >= idle_before):
+            break
+        if (state.processing or state.lock.locked() or session_id in active_tts_tasks
+                or session_id in session_tasks or session_id in connected_sessions):
+            continue
+        evicted.append(session_id)
+    for session_id in evicted:
+        forget_session(session_id)
+    return len(evicted)
+
+def session_connected(session_id: str):
+    connected_sessions[session_id] += 1
+
+def session_disconnected(session_id: str):
+    connected_sessions[session_id] -= 1
+    if connected_sessions[session_id] <= 0:
+        del connected_sessions[session_id]
+
+def evict_idle_sessions():
+    """Drop state for sessions that have been idle longer than SESSION_IDLE_TTL"""
+    evicted = evict_sessions(len(sessions), idle_before=time.monotonic() - SESSION_IDLE_TTL)
+    if evicted:
+        logger.info("[CLEANUP] Evicted state for %s idle sessions", evicted)
+
+# Punctuation is blanked out before queries are compared for duplicates
+NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# The same few strings (current, queued and last query) are normalised on every duplicate check
+@functools.lru_cache(maxsize=1024)
 def normalize_query_text(text: str) -> str:
     if not text:
         return ""
     
     # Convert to lowercase and remove punctuation
-    normalized = re.sub(r'[^\w\s]', ' ', text.lower())
+    normalized = NON_WORD_RE.sub(' ', text.lower())
     # Normalize whitespace (multiple spaces become single space, trim)
     normalized = ' '.join(normalized.split())
     return normalized
@@ -501,13 +751,14 @@ def log_session_state(session_id: str, event: str):
     """
     Log session state for rule compliance tracking
     """
-    processing = session_processing.get(session_id, False)
+    state = sessions.get(session_id)
+    processing = state.processing if state else False
     queue_length = len(session_queues.get(session_id, []))
     response_played = session_response_played.get(session_id, False)
     buffer_cleared = session_buffer_cleared.get(session_id, False)
     current_query = session_current_query.get(session_id, "None")
     
-    logger.info(f"🔍 RULE COMPLIANCE [{event}] Session {session_id}: processing={processing}, queue={queue_length}, played={response_played}, cleared={buffer_cleared}, query='{current_query}'")
+    logger.info("🔍 RULE COMPLIANCE [%s] Session %s: processing=%s, queue=%s, played=%s, cleared=%s, query='%s'", event, session_id, processing, queue_length, response_played, buffer_cleared, current_query)
 
 def is_duplicate_query(session_id: str, query_text: str) -> bool:
     """
@@ -529,54 +780,50 @@ def is_duplicate_query(session_id: str, query_text: str) -> bool:
     if current_query and normalize_query_text(current_query) == normalized_query:
         # If it's the same query and response is already played, it's a duplicate
         if session_response_played.get(session_id, False) or session_tts_completed.get(session_id, False):
-            logger.info(f"🚫 RULE 1: Duplicate detected - response already played for query: '{query_text}'")
+            logger.info("🚫 RULE 1: Duplicate detected - response already played for query: '%s'", query_text)
             return True
-        logger.info(f"🚫 Duplicate detected - matches currently processing query: '{query_text}'")
+        logger.info("🚫 Duplicate detected - matches currently processing query: '%s'", query_text)
         return True
     
-    # Check against all queued queries
-    if session_id in session_queues:
-        for queued_item in session_queues[session_id]:
-            queued_text = queued_item.get('text', '')
-            if normalize_query_text(queued_text) == normalized_query:
-                logger.info(f"🚫 Duplicate detected - matches queued query: '{query_text}'")
-                return True
+    # Check against all queued queries (normalised once, when they were queued)
+    queued_items = session_queues.get(session_id)
+    if queued_items and any(queued_item['normalized'] == normalized_query for queued_item in queued_items):
+        logger.info("🚫 Duplicate detected - matches queued query: '%s'", query_text)
+        return True
     
     # Check against recently processed (last transcript) - reduced time window for stricter control
     last_transcript = session_last_transcript.get(session_id, '')
     if last_transcript and normalize_query_text(last_transcript) == normalized_query:
-        current_time = datetime.now().timestamp()
+        current_time = time.time()
         last_time = session_last_time.get(session_id, 0)
         time_since_last = current_time - last_time
         
         # RULE 1: Reduced time window for stricter duplicate prevention (15 seconds instead of 30)
         if time_since_last < 15:
-            logger.info(f"🚫 RULE 1: Duplicate detected - matches recent processed query: '{query_text}' (time: {time_since_last:.1f}s)")
+            logger.info("🚫 RULE 1: Duplicate detected - matches recent processed query: '%s' (time: %.1fs)", query_text, time_since_last)
             return True
     
-    logger.info(f"✅ Unique query detected: '{query_text}'")
+    logger.info("✅ Unique query detected: '%s'", query_text)
     return False
 
 async def safety_reset_stuck_sessions():
     """Safety mechanism to reset sessions that might be stuck in processing state"""
-    global session_processing, session_last_time
-    
-    current_time = datetime.now().timestamp()
+    current_time = time.time()
     stuck_sessions = []
     
-    for session_id, is_processing in session_processing.items():
-        if is_processing:
+    for session_id, state in sessions.items():
+        if state.processing:
             # Check if session has been processing for more than 30 seconds
             last_time = session_last_time.get(session_id, current_time)
             time_stuck = current_time - last_time
             
             if time_stuck > 30:  # 30 seconds timeout
                 stuck_sessions.append(session_id)
-                logger.warning(f"🚨 Session {session_id} appears stuck in processing state for {time_stuck:.1f}s - force resetting")
+                logger.warning("🚨 Session %s appears stuck in processing state for %.1fs - force resetting", session_id, time_stuck)
     
     # Reset stuck sessions
     for session_id in stuck_sessions:
-        session_processing[session_id] = False
+        sessions[session_id].processing = False
         
         # RULE 4: Clear currently processing query tracking for stuck sessions
         if session_id in session_current_query:
@@ -588,29 +835,32 @@ async def safety_reset_stuck_sessions():
         if session_id in session_buffer_cleared:
             del session_buffer_cleared[session_id]
         
-        logger.info(f"🔓 RULE 4: Force-reset processing flag and state for stuck session {session_id}")
+        logger.info("🔓 RULE 4: Force-reset processing flag and state for stuck session %s", session_id)
         
         # Log queue status for debugging
         queue_length = len(session_queues.get(session_id, []))
         if queue_length > 0:
-            logger.info(f"📋 Session {session_id} has {queue_length} queued items after reset")
+            logger.info("📋 Session %s has %s queued items after reset", session_id, queue_length)
 
 async def cleanup_session_context(old_session_id: str, new_session_id: str):
     """Clean up contexts when switching between sessions"""
-    global session_contexts, murf_websocket_service
+    # The old session's cached history won't be read again soon; free it for active sessions
+    if database_service and old_session_id != new_session_id:
+        database_service.evict_cached_history(old_session_id)
     
     if not murf_websocket_service:
         return
     
     # If switching to a different session, clear the old context
-    if old_session_id != new_session_id and old_session_id in session_contexts:
-        old_context = session_contexts[old_session_id]
+    old_state = sessions.get(old_session_id)
+    if old_session_id != new_session_id and old_state and old_state.context:
+        old_context = old_state.context
         try:
-            logger.info(f"[CLEANUP] Cleaning up context {old_context} for old session {old_session_id}")
+            logger.info("[CLEANUP] Cleaning up context %s for old session %s", old_context, old_session_id)
             await murf_websocket_service._clear_specific_context(old_context)
-            del session_contexts[old_session_id]
+            old_state.context = None
         except Exception as e:
-            logger.error(f"Error cleaning up context for session {old_session_id}: {str(e)}")
+            logger.error("Error cleaning up context for session %s: %s", old_session_id, e)
 
 
 async def process_session_queue(session_id: str, websocket: WebSocket):
@@ -623,28 +873,30 @@ async def process_session_queue(session_id: str, websocket: WebSocket):
     - RULE 4: Complete state management - ensures processing flag and buffers are properly managed
     - RULE 2: Never leaves queue blocked or stuck, always processes remaining items
     """
-    global session_queues, session_processing
+    global session_queues
+    
+    state = get_session_state(session_id)
     
     # RULE 2: Ensure we only process if session is completely ready for next query
-    if session_processing.get(session_id, False):
-        logger.info(f"📋 RULE 2: Session {session_id} still processing, skipping queue processing")
+    if state.processing:
+        logger.info("📋 RULE 2: Session %s still processing, skipping queue processing", session_id)
         return
     
     if session_id not in session_queues or not session_queues[session_id]:
-        logger.info(f"📋 RULE 2: No queued queries for session {session_id}")
+        logger.info("📋 RULE 2: No queued queries for session %s", session_id)
         return
     
     # RULE 2: Get the next query from queue (strict FIFO order)
     next_query = session_queues[session_id].pop(0)
-    logger.info(f"📋 RULE 2: Processing queued query for session {session_id}: '{next_query['text']}' (Queue length: {len(session_queues[session_id])})")
+    logger.info("📋 RULE 2: Processing queued query for session %s: '%s' (Queue length: %s)", session_id, next_query['text'], len(session_queues[session_id]))
     
     # RULE 1: CRITICAL CHECK - Ensure this query hasn't been processed recently
     # This prevents duplicate processing if the same query somehow got queued multiple times
     if is_duplicate_query(session_id, next_query['text']):
-        logger.warning(f"🚫 RULE 1: SKIPPING QUEUED DUPLICATE for session {session_id}: '{next_query['text']}'")
+        logger.warning("🚫 RULE 1: SKIPPING QUEUED DUPLICATE for session %s: '%s'", session_id, next_query['text'])
         # Continue with remaining queue items
         if session_id in session_queues and session_queues[session_id]:
-            logger.info(f"🔄 RULE 2: Processing remaining {len(session_queues[session_id])} queued items after skipping duplicate")
+            logger.info("🔄 RULE 2: Processing remaining %s queued items after skipping duplicate", len(session_queues[session_id]))
             await process_session_queue(session_id, websocket)
         return
     
@@ -658,39 +910,86 @@ async def process_session_queue(session_id: str, websocket: WebSocket):
             next_query['persona'], 
             web_search_enabled=next_query['web_search_enabled']
         )
-        logger.info(f"✅ RULE 2: Completed queued query for session {session_id}")
+        logger.info("✅ RULE 2: Completed queued query for session %s", session_id)
     except Exception as e:
-        logger.error(f"❌ RULE 3: Error processing queued query for session {session_id}: {e}")
+        logger.error("❌ RULE 3: Error processing queued query for session %s: %s", session_id, e)
         # RULE 3: Clear processing flag on error to prevent session lockup
-        session_processing[session_id] = False
-        logger.info(f"🔓 RULE 3: Processing flag cleared due to error for session {session_id}")
+        state.processing = False
+        logger.info("🔓 RULE 3: Processing flag cleared due to error for session %s", session_id)
         
         # RULE 2: Continue processing remaining queue items even if one fails
         if session_id in session_queues and session_queues[session_id]:
-            logger.info(f"🔄 RULE 2: Attempting to process remaining {len(session_queues[session_id])} queued items")
+            logger.info("🔄 RULE 2: Attempting to process remaining %s queued items", len(session_queues[session_id]))
             await process_session_queue(session_id, websocket)
 
 
+# The microphone stream is transcribed from memory; set RECORD_STREAMED_AUDIO=true to also
+# write each connection's raw audio to a temp file (removed again when the socket closes)
+RECORD_STREAMED_AUDIO = settings.record_streamed_audio
+
+# Names of the per-connection audio files created by /ws/audio-stream (prefix + session + .wav)
+TEMP_AUDIO_FILENAME_RE = re.compile(r"voice_agent_.*\.wav\Z", re.DOTALL)
+
+
 def cleanup_old_temp_audio_files():
     """Clean up old temporary audio files that may have been left behind"""
     try:
         temp_dir = tempfile.gettempdir()
-        for filename in os.listdir(temp_dir):
-            if filename.startswith("voice_agent_") and filename.endswith(".wav"):
-                filepath = os.path.join(temp_dir, filename)
+        now = time.time()
+        # scandir yields the directory entries with cached stat info, avoiding a path join + stat per name
+        with os.scandir(temp_dir) as entries:
+            for entry in entries:
+                if not TEMP_AUDIO_FILENAME_RE.match(entry.name):
+                    continue
                 try:
                     # Check if file is older than 1 hour
-                    file_age = datetime.now().timestamp() - os.path.getmtime(filepath)
+                    file_age = now - entry.stat().st_mtime
                     if file_age > 3600:  # 1 hour in seconds
-                        os.unlink(filepath)
-                        logger.info(f"[CLEANUP] Cleaned up old temporary audio file: {filename}")
+                        os.unlink(entry.path)
+                        logger.info("[CLEANUP] Cleaned up old temporary audio file: %s", entry.name)
                 except Exception as e:
-                    logger.warning(f"Failed to clean up old temp file {filename}: {str(e)}")
+                    logger.warning("Failed to clean up old temp file %s: %s", entry.name, e)
     except Exception as e:
-        logger.warning(f"Failed to clean up temp directory: {str(e)}")
+        logger.warning("Failed to clean up temp directory: %s", e)
 
 
 # Global function to handle LLM streaming (moved outside WebSocket handler to prevent duplicates)
+async def save_assistant_response(session_id: str, messages: list, websocket: WebSocket, after: Optional[asyncio.Task] = None):
+    """Write a finished turn to the history, then tell the client it was saved
+
+    `after` is the turn's chunk sender; the notification waits for it so it can't overtake the last chunk.
+    """
+    await database_service.add_messages_to_history(session_id, messages)
+    logger.info("[SUCCESS] Assistant response saved to database after LLM completion")
+    
+    if after is not None:
+        await asyncio.wait([after])
+    
+    # Send notification that response is saved
+    save_notification = {
+        "type": "response_saved",
+        "message": "Assistant response saved to database",
+        "response_length": len(messages[-1][1]),
+        "timestamp": time.time()
+    }
+    await manager.send_json(save_notification, websocket)
+
+
+async def send_cached_fallback_audio(websocket: WebSocket, error_type: ErrorType):
+    """Play the spoken fallback for an error if its audio was pregenerated; never calls Murf"""
+    fallback_audio_url = tts_service.get_fallback_audio_url(error_type) if tts_service else None
+    if not fallback_audio_url:
+        return
+    
+    fallback_message = {
+        "type": "tts_fallback_audio",
+        "audio_url": fallback_audio_url,
+        "message": get_fallback_message(error_type),
+        "timestamp": time.time()
+    }
+    await manager.send_json(fallback_message, websocket)
+
+
 async def handle_llm_streaming(user_message: str, session_id: str, websocket: WebSocket, persona: str = "developer", force_processing: bool = False, web_search_enabled: bool = False):
     """
     Handle LLM streaming response and send to Murf WebSocket for TTS
@@ -703,17 +1002,17 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
     5. USER EXPERIENCE: One fresh answer per query, zero duplicates or echoes
     """
     
-    global session_processing, session_persona_changed, session_contexts, session_last_transcript, session_last_time, session_last_persona, session_current_query, session_response_played, session_buffer_cleared, session_response_ids, session_tts_completed
+    global session_last_transcript, session_last_time, session_last_persona, session_current_query, session_response_played, session_buffer_cleared, session_response_ids, session_tts_completed
     
-    logger.info(f"[TARGET] Starting LLM streaming for session {session_id}: '{user_message}' with persona: {persona}, web_search: {web_search_enabled}")
+    logger.info("[TARGET] Starting LLM streaming for session %s: '%s' with persona: %s, web_search: %s", session_id, user_message, persona, web_search_enabled)
     
     # RULE 1: Check for duplicates before processing
     if is_duplicate_query(session_id, user_message):
-        logger.info(f"🚫 DUPLICATE QUERY REJECTED for session {session_id}: '{user_message}'")
+        logger.info("🚫 DUPLICATE QUERY REJECTED for session %s: '%s'", session_id, user_message)
         return
     
     # RULE 2: COMPLETE BUFFER & STATE RESET before processing new query
-    unique_response_id = f"{session_id}_{datetime.now().timestamp()}_{hash(user_message)}"
+    unique_response_id = f"{session_id}_{time.time()}_{hash(user_message)}"
     session_response_played[session_id] = False
     session_buffer_cleared[session_id] = False
     session_tts_completed[session_id] = False
@@ -722,32 +1021,57 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
     
     # RULE 2: Ensure response buffer is completely clear before starting
     if session_id in session_responses:
-        logger.info(f"🧹 RULE 2: Force clearing previous response buffer for session {session_id}")
+        logger.info("🧹 RULE 2: Force clearing previous response buffer for session %s", session_id)
         del session_responses[session_id]
     session_responses[session_id] = ""  # Initialize fresh buffer
     
     # Track currently processing query for duplicate detection
     session_current_query[session_id] = user_message
     
-    logger.info(f"✅ RULE 2: Complete state reset completed for session {session_id}, response_id: {unique_response_id}")
+    logger.info("✅ RULE 2: Complete state reset completed for session %s, response_id: %s", session_id, unique_response_id)
     session_current_query[session_id] = user_message
     
     log_session_state(session_id, "STATE_INITIALIZED")
     
-    # Check if we're already generating LLM response for this session
-    if session_id not in session_locks:
-        session_locks[session_id] = asyncio.Lock()
+    # One lookup for the lock and flags used throughout this turn
+    state = get_session_state(session_id)
+    
+    # Skip processing flag check if force_processing is True (for persona changes)
+    if not force_processing:
+        # Check for persona changes that might override processing flag
+        if state.persona_changed:
+            logger.info("[PERSONA] Persona change detected for session %s, allowing processing despite active session", session_id)
+            state.persona_changed = False  # Reset the flag
+            force_processing = True
+        else:
+            # The flag covers LLM + TTS and the lock only the LLM phase; either means a turn is in flight.
+            # Don't return - allow the request to proceed, let duplicate detection handle conflicts
+            if state.processing or state.lock.locked():
+                logger.info("[INFO] Session %s is already busy, but allowing new request: '%s'", session_id, user_message)
+    
+    if force_processing:
+        logger.info("🔄 Force processing enabled for session %s - persona change detected", session_id)
+        # For force processing, we still respect the lock but allow processing flag override
+        if state.processing:
+            logger.info("⏳ Force processing will wait for current request to complete for session %s", session_id)
+    
+    # Set processing flag before the first await, so the check in the transcript handler and
+    # this claim happen in one step and a second transcript can't slip in between
+    state.processing = True
+    logger.info("🔒 Set processing flag for session %s: '%s'", session_id, user_message)
+    
+    log_session_state(session_id, "PROCESSING_STARTED")
     
     # CANCEL ANY ACTIVE TTS TASKS FOR THIS SESSION BEFORE STARTING NEW ONE
     if session_id in active_tts_tasks and not active_tts_tasks[session_id].done():
-        logger.info(f"[CANCEL] Cancelling active TTS task for session {session_id} before starting new query")
+        logger.info("[CANCEL] Cancelling active TTS task for session %s before starting new query", session_id)
         try:
             active_tts_tasks[session_id].cancel()
             await active_tts_tasks[session_id]
         except asyncio.CancelledError:
-            logger.info(f"[CANCEL] Previous TTS task cancelled successfully for session {session_id}")
+            logger.info("[CANCEL] Previous TTS task cancelled successfully for session %s", session_id)
         except Exception as e:
-            logger.warning(f"[CANCEL] Error cancelling previous TTS task: {e}")
+            logger.warning("[CANCEL] Error cancelling previous TTS task: %s", e)
         finally:
             if session_id in active_tts_tasks:
                 del active_tts_tasks[session_id]
@@ -757,42 +1081,12 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             "type": "audio_stop",
             "message": "Stopping previous audio for new query",
             "session_id": session_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time()
         }
-        await manager.send_personal_message(json.dumps(audio_stop_message), websocket)
-    
-    # Skip processing flag check if force_processing is True (for persona changes)
-    if not force_processing:
-        # Check for persona changes that might override processing flag
-        persona_change_detected = session_persona_changed.get(session_id, False)
-        if persona_change_detected:
-            logger.info(f"[PERSONA] Persona change detected for session {session_id}, allowing processing despite active session")
-            session_persona_changed[session_id] = False  # Reset the flag
-            force_processing = True
-        else:
-            # Additional check for processing flag
-            current_processing_flag = session_processing.get(session_id, False)
-            logger.info(f"[CHECK] Processing flag check for session {session_id}: {current_processing_flag}, force_processing: {force_processing}")
-            if current_processing_flag:
-                logger.info(f"[INFO] Session {session_id} is already processing, but allowing new request: '{user_message}'")
-                # Don't return - allow the request to proceed, let duplicate detection handle conflicts
-
-            # Use a non-blocking check - if LLM is busy, still allow but log
-            if session_locks[session_id].locked():
-                logger.info(f"[INFO] Session {session_id} LLM is currently busy, but allowing new request: '{user_message}'")
-    
-    if force_processing:
-        logger.info(f"🔄 Force processing enabled for session {session_id} - persona change detected")
-        # For force processing, we still respect the lock but allow processing flag override
-        if session_processing.get(session_id, False):
-            logger.info(f"⏳ Force processing will wait for current request to complete for session {session_id}")
-    
-    # Set processing flag
-    session_processing[session_id] = True
-    logger.info(f"🔒 Set processing flag for session {session_id}: '{user_message}'")
-    logger.info(f"📊 Processing flags after setting: {session_processing}")
-    
-    log_session_state(session_id, "PROCESSING_STARTED")
+        await manager.send_json(audio_stop_message, websocket)
+        
+        # The cancelled turn clears the flag as it unwinds; take it back
+        state.processing = True
     
     # Initialize variables at function scope
     accumulated_response = ""
@@ -801,24 +1095,44 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
     
     # RULE 1: Ensure response buffer is completely clear before starting
     if session_id in session_responses:
-        logger.info(f"🧹 RULE 1: Clearing previous response buffer for session {session_id}")
+        logger.info("🧹 RULE 1: Clearing previous response buffer for session %s", session_id)
         del session_responses[session_id]
     session_responses[session_id] = ""  # Initialize fresh buffer
     web_search_results = None
     
+    user_message_pending = False
+    text_generator = None
+    
+    # Start the Murf WebSocket handshake now so it overlaps history, web search and LLM work
+    murf_connect_task = None
+    if murf_websocket_service:
+        murf_connect_task = asyncio.create_task(murf_websocket_service.ensure_connected())
+        # Mark failures as retrieved if we return before awaiting it; the TTS phase re-raises them
+        murf_connect_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    
+    search_task = None
+    
     try:
+        # Start the web search first so its round trip overlaps the history fetch
+        if web_search_enabled and web_search_service and web_search_service.is_configured():
+            logger.info("🔍 Performing web search for: '%s'", user_message)
+            search_task = asyncio.create_task(web_search_service.search_web(user_message, max_results=3))
+            search_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        
         # Get chat history
         try:
             if not database_service:
                 chat_history = []
             else:
-                chat_history = await database_service.get_chat_history(session_id)
-                # Save user message to chat history
-                save_success = await database_service.add_message_to_history(session_id, "user", user_message)
+                chat_history = await database_service.get_chat_history(session_id, limit=HISTORY_CONTEXT_LIMIT)
         except Exception as e:
-            logger.error(f"Chat history error: {str(e)}")
+            logger.error("Chat history error: %s", e)
             chat_history = []
         
+        # The user message is written together with the assistant reply in one update;
+        # if no reply is produced it is saved on its own during cleanup
+        user_message_pending = database_service is not None
+        
         # Initialize web search results
         web_search_results = None
         search_results = None  # Store actual search results for sources
@@ -829,20 +1143,12 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
         last_processing_time = session_last_time.get(session_id, 0)
         
         # Get current time
-        current_time = datetime.now().timestamp()
+        current_time = time.time()
         time_since_last = current_time - last_processing_time
         
-        # Clean the current message for comparison
-        normalized_current = user_message.lower().strip('.,!?;: ')
-        clean_current = re.sub(r'[^\w\s]', ' ', normalized_current)
-        clean_current = ' '.join(clean_current.split())  # Normalize whitespace
-        
-        # Clean the last message for comparison
-        normalized_last = last_processed_transcript.lower().strip('.,!?;: ')
-        clean_last = ''
-        if normalized_last:
-            clean_last = re.sub(r'[^\w\s]', ' ', normalized_last)
-            clean_last = ' '.join(clean_last.split())  # Normalize whitespace
+        # Clean both messages for comparison (cached from the duplicate checks above)
+        clean_current = normalize_query_text(user_message)
+        clean_last = normalize_query_text(last_processed_transcript)
         
         # Simple exact duplicate check
         is_exact_duplicate = (
@@ -850,29 +1156,27 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             time_since_last < 2.0  # 2 seconds for exact matches
         )
         
-        logger.info(f"[SUCCESS] Duplicate check: '{clean_current}' vs '{clean_last}' - not duplicate, time: {time_since_last:.1f}s")
+        logger.info("[SUCCESS] Duplicate check: '%s' vs '%s' - not duplicate, time: %.1fs", clean_current, clean_last, time_since_last)
         
         # If this is a duplicate, clear the processing flag and return
         if is_exact_duplicate:
-            logger.info(f"🚫 Exact duplicate detected, clearing processing flag for session {session_id}")
-            session_processing[session_id] = False
+            logger.info("🚫 Exact duplicate detected, clearing processing flag for session %s", session_id)
+            state.processing = False
             return
         
-        # Perform web search if enabled
-        if web_search_enabled and web_search_service and web_search_service.is_configured():
+        # Collect the web search started above, right before the prompt needs it
+        if search_task is not None:
+            # Only announced past the duplicate check, which returns without a completion message
+            search_status_message = {
+                "type": "web_search_start",
+                "message": f"Searching the web for: {user_message}",
+                "query": user_message,
+                "timestamp": time.time()
+            }
+            await manager.send_json(search_status_message, websocket)
+            
             try:
-                logger.info(f"🔍 Performing web search for: '{user_message}'")
-                
-                # Send web search status to client
-                search_status_message = {
-                    "type": "web_search_start",
-                    "message": f"Searching the web for: {user_message}",
-                    "query": user_message,
-                    "timestamp": datetime.now().isoformat()
-                }
-                await manager.send_personal_message(json.dumps(search_status_message), websocket)
-                
-                search_results = await web_search_service.search_web(user_message, max_results=3)
+                search_results = await search_task
                 
                 if search_results:
                     # Always format results with URLs for LLM context
@@ -881,7 +1185,7 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                         show_urls=True  # Always show URLs to LLM
                     )
                     
-                    logger.info(f"[SUCCESS] Web search completed, found {len(search_results)} results")
+                    logger.info("[SUCCESS] Web search completed, found %s results", len(search_results))
                     
                     # Send web search results to client
                     search_complete_message = {
@@ -889,24 +1193,24 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                         "message": f"Found {len(search_results)} web results",
                         "results": search_results,
                         "include_urls": True,  # Always include URLs now
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": time.time()
                     }
-                    await manager.send_personal_message(json.dumps(search_complete_message), websocket)
+                    await manager.send_json(search_complete_message, websocket)
                 else:
-                    logger.warning(f"⚠️ No web search results found for: '{user_message}'")
+                    logger.warning("⚠️ No web search results found for: '%s'", user_message)
                     web_search_results = None
                     
             except Exception as e:
-                logger.error(f"❌ Web search error: {str(e)}")
+                logger.error("❌ Web search error: %s", e)
                 web_search_results = None
                 search_error_message = {
                     "type": "web_search_error",
                     "message": f"Web search failed: {str(e)}",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": time.time()
                 }
-                await manager.send_personal_message(json.dumps(search_error_message), websocket)
+                await manager.send_json(search_error_message, websocket)
         else:
-            logger.info(f"🔍 Web search disabled or not configured for this query")
+            logger.info("🔍 Web search disabled or not configured for this query")
             web_search_results = None
         
         # Send LLM streaming start notification
@@ -915,72 +1219,106 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             "message": "LLM is generating response...",
             "user_message": user_message,
             "web_search_enabled": web_search_enabled,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time()
         }
-        await manager.send_personal_message(json.dumps(start_message), websocket)
+        await manager.send_json(start_message, websocket)
         
         # Update session tracking variables for duplicate detection
-        current_time = datetime.now().timestamp()
+        current_time = time.time()
         session_last_transcript[session_id] = user_message
         session_last_time[session_id] = current_time
         session_last_persona[session_id] = persona
-        logger.info(f"📝 Updated session tracking for {session_id}: transcript='{user_message[:50]}...', persona='{persona}'")
+        logger.info("📝 Updated session tracking for %s: transcript='%s...', persona='%s'", session_id, user_message[:50], persona)
         
         # Only lock during LLM generation phase - not during TTS
-        async with session_locks[session_id]:
-            logger.info(f"🔒 Generating LLM response for session {session_id}: '{user_message}'")
+        async with state.lock:
+            logger.info("🔒 Generating LLM response for session %s: '%s'", session_id, user_message)
             
             # Create async generator that yields chunks and saves to DB when complete
             async def llm_text_stream_with_save():
-                nonlocal accumulated_response
+                nonlocal accumulated_response, user_message_pending
                 chunk_count = 0
+                client_buffer = []
+                client_buffer_len = 0
+                last_flush = time.monotonic()
                 
-                # Stream LLM response and collect chunks
-                async for chunk in llm_service.generate_streaming_response(user_message, chat_history, persona, web_search_results):
-                    if chunk:
-                        chunk_count += 1
-                        accumulated_response += chunk
-                        
-                        # Store current response in session tracking for fallback TTS
-                        session_responses[session_id] = accumulated_response
-                        
-                        # Send chunk to client immediately
-                        chunk_message = {
-                            "type": "llm_streaming_chunk",
-                            "chunk": chunk,
-                            "accumulated_length": len(accumulated_response),
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        await manager.send_personal_message(json.dumps(chunk_message), websocket)
-                        
-                        # Yield chunk for TTS processing
-                        yield chunk
+                # Frames go to the client from their own task, so a slow socket never stalls the
+                # LLM stream (and with it TTS); while the queue is full, text keeps coalescing
+                client_frames = asyncio.Queue(maxsize=LLM_CLIENT_QUEUE_SIZE)
                 
-                # LLM streaming is complete - save to database immediately
-                if accumulated_response.strip():
-                    try:
-                        if database_service:
-                            save_success = await database_service.add_message_to_history(session_id, "assistant", accumulated_response)
-                            logger.info(f"[SUCCESS] Assistant response saved to database immediately after LLM completion")
+                async def send_client_frames():
+                    while (frame := await client_frames.get()) is not None:
+                        await manager.send_json(frame, websocket)
+                
+                client_sender = run_in_background(send_client_frames(), f"send LLM chunks for session {session_id}")
+                frames_closed = False
+                
+                def build_chunk_frame(now: float) -> dict:
+                    nonlocal client_buffer, client_buffer_len, last_flush
+                    chunk_message = {
+                        "type": "llm_streaming_chunk",
+                        "chunk": "".join(client_buffer),
+                        "accumulated_length": len(accumulated_response),
+                        "timestamp": time.time()
+                    }
+                    client_buffer = []
+                    client_buffer_len = 0
+                    last_flush = now
+                    return chunk_message
+                
+                try:
+                    # Stream LLM response and collect chunks
+                    async for chunk in llm_service.generate_streaming_response(user_message, chat_history, persona, web_search_results):
+                        if chunk:
+                            chunk_count += 1
+                            accumulated_response += chunk
                             
-                            # Send notification that response is saved
-                            save_notification = {
-                                "type": "response_saved",
-                                "message": "Assistant response saved to database",
-                                "response_length": len(accumulated_response),
-                                "timestamp": datetime.now().isoformat()
-                            }
-                            await manager.send_personal_message(json.dumps(save_notification), websocket)
-                    except Exception as e:
-                        logger.error(f"Failed to save assistant response to database immediately: {str(e)}")
+                            # Store current response in session tracking for fallback TTS
+                            session_responses[session_id] = accumulated_response
+                            
+                            # Coalesce small chunks into fewer client frames; TTS still gets every chunk as it arrives
+                            client_buffer.append(chunk)
+                            client_buffer_len += len(chunk)
+                            # One clock read per chunk serves both the interval check and the flush
+                            now = time.monotonic()
+                            if ((client_buffer_len >= LLM_CHUNK_FLUSH_CHARS or
+                                    now - last_flush >= LLM_CHUNK_FLUSH_INTERVAL) and
+                                    not client_frames.full()):
+                                client_frames.put_nowait(build_chunk_frame(now))
+                            
+                            # Yield chunk for TTS processing
+                            yield chunk
+                    
+                    if client_buffer:
+                        await client_frames.put(build_chunk_frame(time.monotonic()))
+                    await client_frames.put(None)
+                    frames_closed = True
+                finally:
+                    # Abandoned mid-stream (error or cancellation): the sender would otherwise wait on the queue forever
+                    if not frames_closed:
+                        client_sender.cancel()
+                
+                # LLM streaming is complete - save to database without holding up the last chunk
+                if accumulated_response.strip():
+                    if database_service:
+                        if user_message_pending:
+                            turn_messages = [("user", user_message), ("assistant", accumulated_response)]
+                            user_message_pending = False
+                        else:
+                            turn_messages = [("assistant", accumulated_response)]
+                        run_in_background(
+                            save_assistant_response(session_id, turn_messages, websocket, after=client_sender),
+                            f"save response for session {session_id}"
+                        )
                 else:
-                    logger.error(f"❌ Empty accumulated response for: '{user_message}'")
+                    logger.error("❌ Empty accumulated response for: '%s'", user_message)
                     raise Exception("Empty response from LLM stream")
             
-            # Generate the text stream but don't start TTS yet
-            text_generator = llm_text_stream_with_save()
+            # Start pulling LLM chunks now; they are relayed to the client and buffered
+            # while the Murf handshake and TTS setup finish
+            text_generator = PrefetchedStream(llm_text_stream_with_save())
             
-            logger.info(f"🔓 LLM generation completed for session {session_id}, starting TTS phase (unlocked)")
+            logger.info("🔓 LLM generation completed for session %s, starting TTS phase (unlocked)", session_id)
         
         # TTS phase - no longer locked, other requests can be processed
         # RULE 1: CRITICAL CHECK - Prevent TTS if already active, played, or completed
@@ -988,13 +1326,13 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             session_response_played.get(session_id, False) or 
             session_buffer_cleared.get(session_id, False) or 
             session_tts_completed.get(session_id, False)):
-            logger.warning(f"🚫 RULE 1: PREVENTING TTS REPLAY - TTS already processed for session {session_id}")
-            logger.info(f"    - TTS active: {session_tts_active.get(session_id, False)}")
-            logger.info(f"    - Response played: {session_response_played.get(session_id, False)}")
-            logger.info(f"    - Buffer cleared: {session_buffer_cleared.get(session_id, False)}")
-            logger.info(f"    - TTS completed: {session_tts_completed.get(session_id, False)}")
+            logger.warning("🚫 RULE 1: PREVENTING TTS REPLAY - TTS already processed for session %s", session_id)
+            logger.info("    - TTS active: %s", session_tts_active.get(session_id, False))
+            logger.info("    - Response played: %s", session_response_played.get(session_id, False))
+            logger.info("    - Buffer cleared: %s", session_buffer_cleared.get(session_id, False))
+            logger.info("    - TTS completed: %s", session_tts_completed.get(session_id, False))
             # Still need to complete the lifecycle properly
-            session_processing[session_id] = False
+            state.processing = False
             if session_id in session_current_query:
                 del session_current_query[session_id]
             await process_session_queue(session_id, websocket)
@@ -1007,21 +1345,23 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
         try:
             # RULE 1: FINAL CHECK - Mark TTS as starting to prevent any duplicate processing
             if session_tts_completed.get(session_id, False):
-                logger.warning(f"🚫 RULE 1: TTS already completed for session {session_id}, skipping")
-                session_processing[session_id] = False
+                logger.warning("🚫 RULE 1: TTS already completed for session %s, skipping", session_id)
+                state.processing = False
                 await process_session_queue(session_id, websocket)
                 return
                 
-            logger.info(f"🔊 RULE 1: Starting TTS for session {session_id}, response_id: {session_response_ids.get(session_id, 'unknown')}")
-            await murf_websocket_service.ensure_connected()
+            logger.info("🔊 RULE 1: Starting TTS for session %s, response_id: %s", session_id, session_response_ids.get(session_id, 'unknown'))
+            if murf_connect_task is None:
+                murf_connect_task = asyncio.create_task(murf_websocket_service.ensure_connected())
+            await murf_connect_task
             
             # Send LLM stream to Murf and receive base64 audio
             tts_start_message = {
                 "type": "tts_streaming_start", 
                 "message": "Starting TTS streaming with Murf WebSocket...",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": time.time()
             }
-            await manager.send_personal_message(json.dumps(tts_start_message), websocket)
+            await manager.send_json(tts_start_message, websocket)
             
             # Stream LLM text to Murf and get base64 audio back with timeout
             try:
@@ -1031,6 +1371,45 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                     timeout_count = 0
                     max_timeouts = 2  # Reduced from 3 to 2 for faster failure detection
                     
+                    # Audio goes out from its own task: whatever piles up while a frame is being
+                    # sent is drained into the next one, so bursts from Murf become a few large frames
+                    audio_frames = asyncio.Queue()
+                    
+                    async def send_audio_frames():
+                        while (first := await audio_frames.get()) is not None:
+                            audio_parts = [first[0]]
+                            batch_size = len(first[0])
+                            last = first[1]
+                            is_final = last["is_final"]
+                            end_of_stream = False
+                            while batch_size < TTS_AUDIO_BATCH_MAX_BYTES:
+                                try:
+                                    item = audio_frames.get_nowait()
+                                except asyncio.QueueEmpty:
+                                    break
+                                if item is None:
+                                    end_of_stream = True
+                                    break
+                                audio_parts.append(item[0])
+                                batch_size += len(item[0])
+                                last = item[1]
+                                is_final = is_final or last["is_final"]
+                            
+                            header = {
+                                "type": "tts_audio_chunk",
+                                "chunk_number": last["chunk_number"],
+                                "chunks": len(audio_parts),
+                                "chunk_size": batch_size,
+                                "total_size": last["total_size"],
+                                "is_final": is_final,
+                                "timestamp": last["timestamp"]
+                            }
+                            await manager.send_personal_message(tts_audio_frame(header, b"".join(audio_parts)), websocket)
+                            if end_of_stream:
+                                return
+                    
+                    audio_sender = asyncio.create_task(send_audio_frames())
+                    
                     try:
                         # Pass session_id to ensure unique context per session
                         async for audio_response in murf_websocket_service.stream_text_to_audio(text_generator, session_id):
@@ -1038,37 +1417,29 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                                 audio_chunk_count += 1
                                 total_audio_size += audio_response["chunk_size"]
                                 
-                                # Send audio data to client
-                                audio_message = {
-                                    "type": "tts_audio_chunk",
-                                    "audio_base64": audio_response["audio_base64"],
-                                    "chunk_number": audio_response["chunk_number"],
-                                    "chunk_size": audio_response["chunk_size"],
-                                    "total_size": audio_response["total_size"],
-                                    "is_final": audio_response["is_final"],
-                                    "timestamp": audio_response["timestamp"]
-                                }
-                                await manager.send_personal_message(json.dumps(audio_message), websocket)
+                                # Send audio data to client; Murf's base64 is decoded once here and the
+                                # raw PCM travels in a binary frame
+                                audio_frames.put_nowait((base64.b64decode(audio_response["audio_base64"]), audio_response))
                                 
                                 # RULE 1: Check if this is the final chunk - mark as played exactly once
                                 if audio_response["is_final"]:
                                     session_response_played[session_id] = True
                                     session_tts_completed[session_id] = True
-                                    logger.info(f"🎵 RULE 1: TTS playback completed for session {session_id}, response_id: {session_response_ids.get(session_id, 'unknown')}")
+                                    logger.info("🎵 RULE 1: TTS playback completed for session %s, response_id: %s", session_id, session_response_ids.get(session_id, 'unknown'))
                                     
                                     # RULE 1: IMMEDIATE buffer clear after final chunk
                                     if session_id in session_responses:
-                                        logger.info(f"🧹 RULE 1: Immediate buffer clear after final TTS chunk for session {session_id}")
+                                        logger.info("🧹 RULE 1: Immediate buffer clear after final TTS chunk for session %s", session_id)
                                         del session_responses[session_id]
                                         session_buffer_cleared[session_id] = True
                                     break
                             
                             elif audio_response["type"] == "timeout":
                                 timeout_count += 1
-                                logger.warning(f"TTS timeout {timeout_count}/{max_timeouts} for session {session_id}")
+                                logger.warning("TTS timeout %s/%s for session %s", timeout_count, max_timeouts, session_id)
                                 
                                 if timeout_count >= max_timeouts:
-                                    logger.error(f"Too many TTS timeouts ({timeout_count}) for session {session_id}")
+                                    logger.error("Too many TTS timeouts (%s) for session %s", timeout_count, session_id)
                                     raise Exception(f"TTS streaming failed after {max_timeouts} timeouts")
                                 
                                 # Send timeout status to client
@@ -1078,7 +1449,7 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                                     "max_timeouts": max_timeouts,
                                     "timestamp": audio_response["timestamp"]
                                 }
-                                await manager.send_personal_message(json.dumps(timeout_status), websocket)
+                                await manager.send_json(timeout_status, websocket)
                             
                             elif audio_response["type"] == "status":
                                 # Send status updates to client
@@ -1087,15 +1458,23 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                                     "data": audio_response["data"],
                                     "timestamp": audio_response["timestamp"]
                                 }
-                                await manager.send_personal_message(json.dumps(status_message), websocket)
+                                await manager.send_json(status_message, websocket)
                             
                             elif audio_response["type"] == "error":
-                                logger.error(f"TTS error for session {session_id}: {audio_response['error']}")
+                                logger.error("TTS error for session %s: %s", session_id, audio_response['error'])
                                 raise Exception(f"TTS service error: {audio_response['error']}")
                     
+                        
+                        # Let queued audio reach the client before the turn reports completion
+                        audio_frames.put_nowait(None)
+                        await audio_sender
+                    
                     except Exception as e:
-                        logger.error(f"TTS processing error for session {session_id}: {str(e)}")
+                        logger.error("TTS processing error for session %s: %s", session_id, e)
                         raise
+                    finally:
+                        if not audio_sender.done():
+                            audio_sender.cancel()
                 
                 # Create and track TTS task
                 tts_task = asyncio.create_task(process_tts())
@@ -1109,16 +1488,16 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                         del active_tts_tasks[session_id]
 
             except asyncio.TimeoutError:
-                logger.error(f"TTS streaming timed out after 45s for session {session_id}")
+                logger.error("TTS streaming timed out after 45s for session %s", session_id)
 
                 # Cancel any ongoing TTS task for this session
                 if session_id in active_tts_tasks:
-                    logger.info(f"[CANCEL] Cancelling ongoing TTS task for session {session_id}")
+                    logger.info("[CANCEL] Cancelling ongoing TTS task for session %s", session_id)
                     active_tts_tasks[session_id].cancel()
                     try:
                         await active_tts_tasks[session_id]
                     except asyncio.CancelledError:
-                        logger.info(f"[CANCEL] TTS task cancelled successfully for session {session_id}")
+                        logger.info("[CANCEL] TTS task cancelled successfully for session %s", session_id)
                     del active_tts_tasks[session_id]
 
                 # Send timeout notification to client
@@ -1126,13 +1505,13 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                     "type": "tts_timeout",
                     "message": "TTS streaming timed out, attempting fallback...",
                     "session_id": session_id,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": time.time()
                 }
-                await manager.send_personal_message(json.dumps(timeout_message), websocket)
+                await manager.send_json(timeout_message, websocket)
 
                 # Don't clear processing flag immediately - wait for fallback to complete
                 # This prevents new transcripts from being processed while fallback is running
-                logger.warning(f"[CLEANUP] TTS timeout - keeping processing flag set during fallback for session {session_id}")
+                logger.warning("[CLEANUP] TTS timeout - keeping processing flag set during fallback for session %s", session_id)
 
                 # RULE 3: Single fallback attempt with strict buffer validation
                 try:
@@ -1142,13 +1521,13 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                     already_cleared = session_buffer_cleared.get(session_id, False)
                     
                     if already_played or already_cleared:
-                        logger.warning(f"🚫 RULE 1: Skipping fallback - response already played or cleared for session {session_id}")
+                        logger.warning("🚫 RULE 1: Skipping fallback - response already played or cleared for session %s", session_id)
                         raise Exception("Response already played - preventing replay per RULE 1")
                     
                     if tts_service and current_response:
-                        logger.info(f"RULE 3: Single fallback TTS attempt for session {session_id}, response_id: {session_response_ids.get(session_id, 'unknown')}")
-                        logger.info(f"Current response length: {len(current_response)} chars")
-                        logger.info(f"Response preview: {current_response[:100]}...")
+                        logger.info("RULE 3: Single fallback TTS attempt for session %s, response_id: %s", session_id, session_response_ids.get(session_id, 'unknown'))
+                        logger.info("Current response length: %s chars", len(current_response))
+                        logger.info("Response preview: %s...", current_response[:100])
                         
                         fallback_audio_url = await tts_service.generate_speech(
                             current_response, 
@@ -1161,10 +1540,10 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                                 "audio_url": fallback_audio_url,
                                 "message": "Using fallback audio generation due to WebSocket timeout",
                                 "response_id": session_response_ids.get(session_id, 'unknown'),
-                                "timestamp": datetime.now().isoformat()
+                                "timestamp": time.time()
                             }
-                            await manager.send_personal_message(json.dumps(fallback_message), websocket)
-                            logger.info(f"[SUCCESS] RULE 3: Fallback audio generated and sent for session {session_id}")
+                            await manager.send_json(fallback_message, websocket)
+                            logger.info("[SUCCESS] RULE 3: Fallback audio generated and sent for session %s", session_id)
                             
                             # RULE 1: Mark as played exactly once after fallback success
                             session_response_played[session_id] = True
@@ -1172,7 +1551,7 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                             
                             # RULE 1: IMMEDIATE buffer clear after fallback playback
                             if session_id in session_responses:
-                                logger.info(f"🧹 RULE 1: Immediate buffer clear after fallback playback for session {session_id}")
+                                logger.info("🧹 RULE 1: Immediate buffer clear after fallback playback for session %s", session_id)
                                 del session_responses[session_id]
                                 session_buffer_cleared[session_id] = True
                         else:
@@ -1184,30 +1563,31 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                             raise Exception("TTS service not available")
 
                     # RULE 2: Clear processing flag after successful fallback
-                    logger.info(f"RULE 2: Clearing processing flag after successful fallback for session {session_id}")
-                    session_processing[session_id] = False
+                    logger.info("RULE 2: Clearing processing flag after successful fallback for session %s", session_id)
+                    state.processing = False
                     
                     # RULE 4: Process any queued queries immediately after fallback success
                     await process_session_queue(session_id, websocket)
 
                 except Exception as fallback_error:
-                    logger.error(f"❌ RULE 3: Fallback TTS failed: {fallback_error}")
+                    logger.error("❌ RULE 3: Fallback TTS failed: %s", fallback_error)
                     
                     # RULE 5: When uncertain, skip replaying and clear state
                     timeout_message = {
                         "type": "tts_streaming_timeout",
                         "message": "TTS streaming timed out - continuing without audio. Ready for next query.",
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": time.time()
                     }
-                    await manager.send_personal_message(json.dumps(timeout_message), websocket)
+                    await manager.send_json(timeout_message, websocket)
+                    await send_cached_fallback_audio(websocket, ErrorType.TIMEOUT_ERROR)
 
                     # RULE 3: Always clear processing flag and buffers on TTS failure
-                    session_processing[session_id] = False
-                    logger.info(f"🔓 RULE 3: Processing flag cleared after TTS timeout for session {session_id}")
+                    state.processing = False
+                    logger.info("🔓 RULE 3: Processing flag cleared after TTS timeout for session %s", session_id)
                     
                     # RULE 1: Force clear response buffer to prevent any possibility of replay
                     if session_id in session_responses:
-                        logger.info(f"🧹 RULE 1: Force clearing response buffer after TTS failure for session {session_id}")
+                        logger.info("🧹 RULE 1: Force clearing response buffer after TTS failure for session %s", session_id)
                         del session_responses[session_id]
                     session_buffer_cleared[session_id] = True
                     session_response_played[session_id] = True  # Mark as completed to prevent retry
@@ -1220,20 +1600,20 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                         "type": "session_reset",
                         "message": "Session ready for next query (TTS failed but system is responsive)",
                         "session_id": session_id,
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": time.time()
                     }
-                    await manager.send_personal_message(json.dumps(reset_message), websocket)
+                    await manager.send_json(reset_message, websocket)
         except Exception as e:
-            logger.error(f"Error with Murf WebSocket streaming: {str(e)}")
+            logger.error("Error with Murf WebSocket streaming: %s", e)
             
             # Try fallback TTS immediately when streaming fails
             try:
                 # RULE 3: Use session-specific response but ensure no replay from previous queries
                 current_response = session_responses.get(session_id, "").strip()
                 if tts_service and current_response and not session_response_played.get(session_id, False):
-                    logger.info(f"RULE 3: TTS streaming failed, attempting fallback TTS generation for session {session_id}...")
-                    logger.info(f"Current response length: {len(current_response)} chars")
-                    logger.info(f"Response preview: {current_response[:100]}...")
+                    logger.info("RULE 3: TTS streaming failed, attempting fallback TTS generation for session %s...", session_id)
+                    logger.info("Current response length: %s chars", len(current_response))
+                    logger.info("Response preview: %s...", current_response[:100])
                     fallback_audio_url = await tts_service.generate_speech(
                         current_response, 
                         format="MP3"
@@ -1244,9 +1624,9 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                             "type": "tts_fallback_audio",
                             "audio_url": fallback_audio_url,
                             "message": "TTS streaming failed, using fallback audio generation",
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": time.time()
                         }
-                        await manager.send_personal_message(json.dumps(fallback_message), websocket)
+                        await manager.send_json(fallback_message, websocket)
                         logger.info("[SUCCESS] RULE 3: Fallback audio generated successfully after streaming failure")
                         
                         # RULE 1: Mark as played exactly once after fallback success
@@ -1262,20 +1642,21 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                         raise Exception("TTS service not available")
                     
             except Exception as fallback_error:
-                logger.error(f"RULE 3: Fallback TTS also failed: {fallback_error}")
+                logger.error("RULE 3: Fallback TTS also failed: %s", fallback_error)
                 error_message = {
                     "type": "tts_streaming_error",
                     "message": f"Both streaming and fallback TTS failed: {str(e)}",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": time.time()
                 }
-                await manager.send_personal_message(json.dumps(error_message), websocket)
+                await manager.send_json(error_message, websocket)
+                await send_cached_fallback_audio(websocket, ErrorType.TTS_ERROR)
                 
                 # RULE 3: Clear processing flag and buffers even on total failure
-                session_processing[session_id] = False
+                state.processing = False
                 
                 # RULE 1: Clear response buffer even on total failure to prevent replay
                 if session_id in session_responses:
-                    logger.info(f"🧹 RULE 1: Clearing response buffer after total TTS failure for session {session_id}")
+                    logger.info("🧹 RULE 1: Clearing response buffer after total TTS failure for session %s", session_id)
                     del session_responses[session_id]
                     session_buffer_cleared[session_id] = True
                 
@@ -1298,18 +1679,18 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             "session_id": session_id,
             "response_id": session_response_ids.get(session_id, 'unknown'),
             "session_ready": True,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time()
         }
-        await manager.send_personal_message(json.dumps(complete_message), websocket)
+        await manager.send_json(complete_message, websocket)
         
         # RULE 1: GUARANTEED BUFFER CLEARING - even if already cleared during TTS
         if session_id in session_responses and not session_buffer_cleared.get(session_id, False):
-            logger.info(f"🧹 RULE 1: Final buffer clear after completion for session {session_id}")
+            logger.info("🧹 RULE 1: Final buffer clear after completion for session %s", session_id)
             del session_responses[session_id]
             session_buffer_cleared[session_id] = True
         
         # RULE 2: Complete state reset for next query
-        session_processing[session_id] = False
+        state.processing = False
         
         # RULE 4: Clear all query-specific tracking
         if session_id in session_current_query:
@@ -1323,7 +1704,7 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
         if session_id in session_response_ids:
             del session_response_ids[session_id]
         
-        logger.info(f"🔓 RULE 2: Complete state reset for session {session_id} - ready for next request")
+        logger.info("🔓 RULE 2: Complete state reset for session %s - ready for next request", session_id)
         
         log_session_state(session_id, "PROCESSING_COMPLETED")
         
@@ -1335,23 +1716,24 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             "type": "session_reset",
             "message": "Session ready for next query",
             "session_id": session_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time()
         }
-        await manager.send_personal_message(json.dumps(reset_message), websocket)
+        await manager.send_json(reset_message, websocket)
         
-        logger.info(f"[SUCCESS] RULE COMPLIANCE: LLM streaming and TTS completed for session {session_id}. State cleared, session reset and ready for next request.")
+        logger.info("[SUCCESS] RULE COMPLIANCE: LLM streaming and TTS completed for session %s. State cleared, session reset and ready for next request.", session_id)
         
     except Exception as e:
-        logger.error(f"Error in LLM streaming: {str(e)}")
+        logger.error("Error in LLM streaming: %s", e)
         error_message = {
             "type": "llm_streaming_error",
             "message": f"Error generating LLM response: {str(e)}",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time()
         }
-        await manager.send_personal_message(json.dumps(error_message), websocket)
+        await manager.send_json(error_message, websocket)
+        await send_cached_fallback_audio(websocket, ErrorType.LLM_ERROR)
         
         # RULE 3: Clear processing flag and process queue even on LLM error
-        session_processing[session_id] = False
+        state.processing = False
         
         # RULE 4: Clear currently processing query tracking on error
         if session_id in session_current_query:
@@ -1359,7 +1741,7 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
         
         # RULE 1: Clear response buffer even on LLM error to prevent replay
         if session_id in session_responses:
-            logger.info(f"🧹 RULE 1: Clearing response buffer after LLM error for session {session_id}")
+            logger.info("🧹 RULE 1: Clearing response buffer after LLM error for session %s", session_id)
             del session_responses[session_id]
             session_buffer_cleared[session_id] = True
         
@@ -1371,18 +1753,33 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
         await process_session_queue(session_id, websocket)
     
     finally:
+        # A duplicate or early error can leave the web search unawaited
+        if search_task is not None and not search_task.done():
+            search_task.cancel()
+        
+        # Stop a prefetch the TTS phase never drained, so it can't save or send after cleanup
+        if text_generator is not None:
+            await text_generator.aclose()
+        
+        # Persist the user's turn even when no assistant reply was saved with it
+        if user_message_pending and database_service:
+            run_in_background(
+                database_service.add_message_to_history(session_id, "user", user_message),
+                f"save user message for session {session_id}"
+            )
+        
         # Comprehensive cleanup to ensure smooth operation
         try:
             # 1. Cancel any active TTS tasks for this session
             if session_id in active_tts_tasks and not active_tts_tasks[session_id].done():
-                logger.info(f"[CLEANUP] Cancelling active TTS task for session {session_id}")
+                logger.info("[CLEANUP] Cancelling active TTS task for session %s", session_id)
                 try:
                     active_tts_tasks[session_id].cancel()
                     await active_tts_tasks[session_id]
                 except asyncio.CancelledError:
-                    logger.info(f"[CLEANUP] TTS task cancelled successfully for session {session_id}")
+                    logger.info("[CLEANUP] TTS task cancelled successfully for session %s", session_id)
                 except Exception as e:
-                    logger.warning(f"[CLEANUP] Error cancelling TTS task: {e}")
+                    logger.warning("[CLEANUP] Error cancelling TTS task: %s", e)
                 finally:
                     if session_id in active_tts_tasks:
                         del active_tts_tasks[session_id]
@@ -1391,12 +1788,12 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             if murf_websocket_service:
                 current_context = murf_websocket_service.get_current_context_id()
                 if current_context:
-                    logger.info(f"[CLEANUP] Clearing Murf context {current_context} for session {session_id}")
+                    logger.info("[CLEANUP] Clearing Murf context %s for session %s", current_context, session_id)
                     try:
                         await murf_websocket_service._clear_specific_context(current_context)
-                        logger.info(f"[CLEANUP] Successfully cleared context {current_context}")
+                        logger.info("[CLEANUP] Successfully cleared context %s", current_context)
                     except Exception as e:
-                        logger.warning(f"[CLEANUP] Error clearing context {current_context}: {e}")
+                        logger.warning("[CLEANUP] Error clearing context %s: %s", current_context, e)
                         # Force clear from internal tracking
                         murf_websocket_service.active_contexts.discard(current_context)
                         murf_websocket_service.current_context_id = None
@@ -1411,10 +1808,8 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
                 del session_last_time[session_id]
             if session_id in session_last_persona:
                 del session_last_persona[session_id]
-            if session_id in session_persona_changed:
-                del session_persona_changed[session_id]
-            if session_id in session_contexts:
-                del session_contexts[session_id]
+            state.persona_changed = False
+            state.context = None
             if session_id in session_responses:
                 del session_responses[session_id]
             if session_id in session_queues:
@@ -1441,13 +1836,12 @@ async def handle_llm_streaming(user_message: str, session_id: str, websocket: We
             if session_id in session_tts_completed:
                 del session_tts_completed[session_id]
 
-            logger.info(f"🔓 RULE 2: Session {session_id} cleanup completed with all state variables cleared")
-            logger.info(f"📊 Current processing flags: {session_processing}")
+            logger.info("🔓 RULE 2: Session %s cleanup completed with all state variables cleared", session_id)
 
         except Exception as cleanup_error:
-            logger.error(f"❌ Error during cleanup for session {session_id}: {cleanup_error}")
+            logger.error("❌ Error during cleanup for session %s: %s", session_id, cleanup_error)
             # RULE 3: Force clear critical flags to prevent session lockup
-            session_processing[session_id] = False
+            state.processing = False
             if session_id in active_tts_tasks:
                 del active_tts_tasks[session_id]
             if session_id in session_queues:
@@ -1515,28 +1909,91 @@ async def test_tts(request: Request):
         async def simple_text_stream():
             yield text
         
-        # Test TTS streaming
-        audio_chunks = []
-        async for audio_response in murf_websocket_service.stream_text_to_audio(simple_text_stream()):
-            if audio_response.get("type") == "audio_chunk":
-                audio_chunks.append({
-                    "chunk_number": audio_response.get("chunk_number"),
-                    "chunk_size": audio_response.get("chunk_size"),
-                    "is_final": audio_response.get("is_final")
-                })
+        # Stream one NDJSON line per audio chunk as Murf produces it, then a summary line
+        async def ndjson_chunks():
+            chunks_received = 0
+            try:
+                async for audio_response in murf_websocket_service.stream_text_to_audio(simple_text_stream()):
+                    if audio_response.get("type") == "audio_chunk":
+                        chunks_received += 1
+                        yield orjson.dumps({
+                            "chunk_number": audio_response.get("chunk_number"),
+                            "chunk_size": audio_response.get("chunk_size"),
+                            "is_final": audio_response.get("is_final")
+                        }) + b"\n"
+                
+                yield orjson.dumps({
+                    "success": True,
+                    "message": "TTS test completed",
+                    "audio_chunks_received": chunks_received
+                }) + b"\n"
+            except Exception as e:
+                logger.error(f"TTS test failed: {str(e)}")
+                yield orjson.dumps({"success": False, "message": f"TTS test failed: {str(e)}"}) + b"\n"
         
-        return {
-            "success": True, 
-            "message": f"TTS test completed", 
-            "audio_chunks_received": len(audio_chunks),
-            "chunks_info": audio_chunks
-        }
+        # An explicit Content-Encoding makes GZipMiddleware pass the stream through; gzip would
+        # otherwise hold every line in the compressor and deliver them all at the end
+        return StreamingResponse(
+            ndjson_chunks(),
+            media_type="application/x-ndjson",
+            headers={"Content-Encoding": "identity"}
+        )
         
     except Exception as e:
         logger.error(f"TTS test failed: {str(e)}")
         return {"success": False, "message": f"TTS test failed: {str(e)}"}
 
 
+async def _apply_api_keys(command_data: dict, session_id: str, websocket: WebSocket, transcription_callback, websocket_callback):
+    """Handle an api_keys_update command: rebuild the services and restart streaming transcription"""
+    api_keys_data = command_data.get("api_keys", {})
+    
+    # Create APIKeyConfig from user data
+    user_config = APIKeyConfig(
+        gemini_api_key=api_keys_data.get("gemini_api_key", ""),
+        assemblyai_api_key=api_keys_data.get("assemblyai_api_key", ""),
+        murf_api_key=api_keys_data.get("murf_api_key", ""),
+        murf_voice_id=api_keys_data.get("murf_voice_id", "en-IN-aarav"),
+        tavily_api_key=api_keys_data.get("tavily_api_key", "")
+    )
+    
+    # Reinitialize services with user keys
+    success = reinitialize_services_with_user_keys(user_config)
+    
+    if success and assemblyai_streaming_service:
+        # Reinitialize the streaming service with the new callback
+        try:
+            await assemblyai_streaming_service.stop_streaming_transcription()
+            assemblyai_streaming_service.set_transcription_callback(transcription_callback)
+            await assemblyai_streaming_service.start_streaming_transcription(
+                websocket_callback=websocket_callback
+            )
+            logger.info("[SUCCESS] AssemblyAI streaming reinitialized for session %s", session_id)
+        except Exception as streaming_error:
+            logger.error("Failed to reinitialize streaming: %s", streaming_error)
+    
+    if success:
+        logger.info("[SUCCESS] Services reinitialized with user API keys for session %s", session_id)
+        response = {
+            "type": "api_keys_updated",
+            "success": True,
+            "message": "API keys updated successfully",
+            "streaming_ready": assemblyai_streaming_service is not None,
+            "timestamp": time.time()
+        }
+    else:
+        logger.error("[ERROR] Failed to reinitialize services with user API keys for session %s", session_id)
+        response = {
+            "type": "api_keys_updated",
+            "success": False,
+            "message": "Failed to update API keys",
+            "streaming_ready": False,
+            "timestamp": time.time()
+        }
+    
+    await manager.send_json(response, websocket)
+
+
 @app.websocket("/ws/audio-stream")
 async def audio_stream_websocket(websocket: WebSocket):
     await manager.connect(websocket)
@@ -1548,14 +2005,17 @@ async def audio_stream_websocket(websocket: WebSocket):
     if not session_id:
         session_id = str(uuid.uuid4())
     
-    # Use temporary file instead of saving to streamed_audio folder
-    temp_audio_file = tempfile.NamedTemporaryFile(delete=False, suffix=f"_{session_id}.wav", prefix="voice_agent_")
-    audio_filepath = temp_audio_file.name
-    audio_filename = os.path.basename(audio_filepath)
-    temp_audio_file.close()  # Close the file handle so we can open it for writing
+    # Use temporary file instead of saving to streamed_audio folder (only when recording is enabled)
+    audio_filepath = None
+    audio_filename = None
+    if RECORD_STREAMED_AUDIO:
+        temp_audio_file = tempfile.NamedTemporaryFile(delete=False, suffix=f"_{session_id}.wav", prefix="voice_agent_")
+        audio_filepath = temp_audio_file.name
+        audio_filename = os.path.basename(audio_filepath)
+        temp_audio_file.close()  # Close the file handle so we can open it for writing
     is_websocket_active = True
     last_processed_transcript = ""  # Track last processed transcript to prevent duplicates
-    last_processing_time = datetime.now().timestamp()  # Initialize to current time to avoid huge time differences
+    last_processing_time = time.time()  # Initialize to current time to avoid huge time differences
     last_processed_persona = ""  # Track persona of last processed transcript
     current_persona = "developer"  # Default persona
     
@@ -1563,7 +2023,7 @@ async def audio_stream_websocket(websocket: WebSocket):
         nonlocal last_processed_transcript, last_processing_time, last_processed_persona
         try:
             if is_websocket_active and manager.is_connected(websocket):
-                await manager.send_personal_message(json.dumps(transcript_data), websocket)
+                await manager.send_json(transcript_data, websocket)
 
                 # Only process final transcripts
                 if transcript_data.get("type") == "final_transcript":
@@ -1571,7 +2031,7 @@ async def audio_stream_websocket(websocket: WebSocket):
 
                     # Skip if too short
                     if len(final_text.strip()) < 3:
-                        logger.info(f"Skipping short transcript: '{final_text}'")
+                        logger.info("Skipping short transcript: '%s'", final_text)
                         return
 
                     # CHECK FOR API KEYS BEFORE PROCESSING
@@ -1581,19 +2041,20 @@ async def audio_stream_websocket(websocket: WebSocket):
                             "type": "api_keys_required",
                             "message": "Please configure your API keys in settings before using the voice agent",
                             "transcript": final_text,
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": time.time()
                         }
-                        await manager.send_personal_message(json.dumps(error_message), websocket)
+                        await manager.send_json(error_message, websocket)
                         return
 
                     # RULE 1: COMPREHENSIVE DUPLICATE DETECTION
                     # Check against: currently processing + queue + recent history
                     if is_duplicate_query(session_id, final_text):
-                        logger.info(f"🚫 DUPLICATE QUERY REJECTED in transcript: '{final_text}'")
+                        logger.info("🚫 DUPLICATE QUERY REJECTED in transcript: '%s'", final_text)
                         return
 
                     # Also check if the session is currently processing
-                    is_currently_processing = session_processing.get(session_id, False)
+                    state = get_session_state(session_id)
+                    is_currently_processing = state.processing
                     
                     # Initialize queue for this session if it doesn't exist
                     if session_id not in session_queues:
@@ -1603,13 +2064,14 @@ async def audio_stream_websocket(websocket: WebSocket):
                         # RULE 2: Add to FIFO queue (only if not duplicate)
                         queue_item = {
                             'text': final_text,
+                            'normalized': normalize_query_text(final_text),
                             'persona': current_persona,
-                            'web_search_enabled': session_web_search.get(session_id, False),
-                            'timestamp': datetime.now().timestamp()
+                            'web_search_enabled': state.web_search,
+                            'timestamp': time.time()
                         }
                         session_queues[session_id].append(queue_item)
                         queue_length = len(session_queues[session_id])
-                        logger.info(f"📋 UNIQUE query added to queue for session {session_id}: '{final_text}' (Queue length: {queue_length})")
+                        logger.info("📋 UNIQUE query added to queue for session %s: '%s' (Queue length: %s)", session_id, final_text, queue_length)
                         
                         # Send queue status to client
                         queue_message = {
@@ -1618,21 +2080,29 @@ async def audio_stream_websocket(websocket: WebSocket):
                             "query": final_text,
                             "queue_position": queue_length,
                             "session_id": session_id,
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": time.time()
                         }
-                        await manager.send_personal_message(json.dumps(queue_message), websocket)
+                        await manager.send_json(queue_message, websocket)
                         return
 
                     # Process immediately if system is ready
-                    current_time = datetime.now().timestamp()
+                    current_time = time.time()
                     time_since_last = current_time - last_processing_time
-                    logger.info(f"📝 Processing transcript immediately: '{final_text}' (time since last: {time_since_last:.1f}s)")
+                    logger.info("📝 Processing transcript immediately: '%s' (time since last: %.1fs)", final_text, time_since_last)
 
                     # Get web search enabled status
-                    web_search_enabled = session_web_search.get(session_id, False)
+                    web_search_enabled = state.web_search
 
-                    # RULE 3: Always answer the most recent unique query clearly and directly
-                    await handle_llm_streaming(final_text, session_id, websocket, current_persona, web_search_enabled=web_search_enabled)
+                    # RULE 3: Always answer the most recent unique query clearly and directly.
+                    # Awaited directly so handle_llm_streaming claims the processing flag before this
+                    # callback yields; the callback's own task is recorded so a disconnect can cancel the turn
+                    turn_task = asyncio.current_task()
+                    session_tasks[session_id] = turn_task
+                    try:
+                        await handle_llm_streaming(final_text, session_id, websocket, current_persona, web_search_enabled=web_search_enabled)
+                    finally:
+                        if session_tasks.get(session_id) is turn_task:
+                            del session_tasks[session_id]
 
                     # RULE 4: Update tracking variables after successful processing
                     last_processed_transcript = final_text
@@ -1645,16 +2115,17 @@ async def audio_stream_websocket(websocket: WebSocket):
                     session_last_persona[session_id] = current_persona
 
         except Exception as e:
-            logger.error(f"Error in transcription callback: {str(e)}")
+            logger.error("Error in transcription callback: %s", e)
 
+    async def safe_websocket_callback(msg):
+        if is_websocket_active and manager.is_connected(websocket):
+            return await manager.send_json(msg, websocket)
+        return None
+    
+    session_connected(session_id)
     try:
         if assemblyai_streaming_service:
             assemblyai_streaming_service.set_transcription_callback(transcription_callback)
-            async def safe_websocket_callback(msg):
-                if is_websocket_active and manager.is_connected(websocket):
-                    return await manager.send_personal_message(json.dumps(msg), websocket)
-                return None
-            
             await assemblyai_streaming_service.start_streaming_transcription(
                 websocket_callback=safe_websocket_callback
             )
@@ -1665,11 +2136,13 @@ async def audio_stream_websocket(websocket: WebSocket):
             "session_id": session_id,
             "audio_filename": audio_filename,
             "transcription_enabled": assemblyai_streaming_service is not None,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time()
         }
-        await manager.send_personal_message(json.dumps(welcome_message), websocket)
+        await manager.send_json(welcome_message, websocket)
         
-        with open(audio_filepath, "wb") as audio_file:
+        # Recorded audio is written from a worker thread so receiving never waits on the disk
+        audio_writer = BackgroundFileWriter(audio_filepath) if audio_filepath else None
+        try:
             chunk_count = 0
             total_bytes = 0
             
@@ -1682,17 +2155,21 @@ async def audio_stream_websocket(websocket: WebSocket):
                         
                         # Try to parse as JSON first (for session_id and persona_update messages)
                         try:
-                            command_data = json.loads(text_data)
+                            command_data = orjson.loads(text_data)
                             if isinstance(command_data, dict):
                                 command_type = command_data.get("type")
+                                # One clock read serves whichever quick acknowledgement below gets sent
+                                received_at = time.time()
                                 
                                 if command_type == "session_id":
                                     # Update session_id if provided from frontend
                                     new_session_id = command_data.get("session_id")
                                     if new_session_id and new_session_id != session_id:
-                                        logger.info(f"Updating session_id from {session_id} to {new_session_id}")
+                                        logger.info("Updating session_id from %s to %s", session_id, new_session_id)
                                         old_session_id = session_id
                                         session_id = new_session_id
+                                        session_disconnected(old_session_id)
+                                        session_connected(session_id)
                                         # Clean up context for the old session
                                         await cleanup_session_context(old_session_id, new_session_id)
                                         # Note: Keep using the same temporary file for this session
@@ -1701,14 +2178,14 @@ async def audio_stream_websocket(websocket: WebSocket):
                                     # Update persona if provided from frontend
                                     new_persona = command_data.get("persona")
                                     if new_persona and new_persona != current_persona:
-                                        logger.info(f"Updating persona from {current_persona} to {new_persona}")
+                                        logger.info("Updating persona from %s to %s", current_persona, new_persona)
                                         current_persona = new_persona
                                     
                                     # Update web search state if provided from frontend
                                     web_search_state = command_data.get("web_search_enabled")
                                     if web_search_state is not None:
-                                        session_web_search[session_id] = web_search_state
-                                        logger.info(f"🔍 Initial web search state set to: {web_search_state} for session {session_id}")
+                                        get_session_state(session_id).web_search = web_search_state
+                                        logger.info("🔍 Initial web search state set to: %s for session %s", web_search_state, session_id)
                                     
                                     continue
                                 
@@ -1716,7 +2193,7 @@ async def audio_stream_websocket(websocket: WebSocket):
                                     # Handle real-time persona updates
                                     new_persona = command_data.get("persona")
                                     if new_persona and new_persona != current_persona:
-                                        logger.info(f"Real-time persona update from {current_persona} to {new_persona}")
+                                        logger.info("Real-time persona update from %s to %s", current_persona, new_persona)
                                         current_persona = new_persona
                                         
                                         # Send confirmation back to client
@@ -1724,99 +2201,47 @@ async def audio_stream_websocket(websocket: WebSocket):
                                             "type": "persona_updated",
                                             "persona": current_persona,
                                             "message": f"Persona updated to {current_persona}",
-                                            "timestamp": datetime.now().isoformat()
+                                            "timestamp": received_at
                                         }
-                                        await manager.send_personal_message(json.dumps(persona_response), websocket)
+                                        await manager.send_json(persona_response, websocket)
                                     continue
                                 
                                 elif command_type == "web_search_update":
                                     # Handle web search state updates
                                     web_search_enabled = command_data.get("web_search_enabled", False)
-                                    session_web_search[session_id] = web_search_enabled
-                                    logger.info(f"🔍 Web search {'enabled' if web_search_enabled else 'disabled'} for session {session_id}")
+                                    get_session_state(session_id).web_search = web_search_enabled
+                                    logger.info("🔍 Web search %s for session %s", 'enabled' if web_search_enabled else 'disabled', session_id)
                                     
                                     # Send confirmation back to client
                                     web_search_response = {
                                         "type": "web_search_updated",
                                         "enabled": web_search_enabled,
                                         "message": f"Web search {'enabled' if web_search_enabled else 'disabled'}",
-                                        "timestamp": datetime.now().isoformat()
+                                        "timestamp": received_at
                                     }
-                                    await manager.send_personal_message(json.dumps(web_search_response), websocket)
+                                    await manager.send_json(web_search_response, websocket)
                                     continue
                                 
                                 elif command_type == "web_search_toggle":
                                     # Handle web search toggle
                                     web_search_enabled = command_data.get("enabled", False)
-                                    session_web_search[session_id] = web_search_enabled
-                                    logger.info(f"Web search {'enabled' if web_search_enabled else 'disabled'} for session {session_id}")
+                                    get_session_state(session_id).web_search = web_search_enabled
+                                    logger.info("Web search %s for session %s", 'enabled' if web_search_enabled else 'disabled', session_id)
                                     
                                     # Send confirmation back to client
                                     web_search_response = {
                                         "type": "web_search_toggled",
                                         "enabled": web_search_enabled,
                                         "message": f"Web search {'enabled' if web_search_enabled else 'disabled'}",
-                                        "timestamp": datetime.now().isoformat()
+                                        "timestamp": received_at
                                     }
-                                    await manager.send_personal_message(json.dumps(web_search_response), websocket)
+                                    await manager.send_json(web_search_response, websocket)
                                     continue
                                 
                                 elif command_type == "api_keys_update":
-                                    # Handle API keys update from frontend
-                                    api_keys_data = command_data.get("api_keys", {})
-                                    
-                                    # Create APIKeyConfig from user data
-                                    user_config = APIKeyConfig(
-                                        gemini_api_key=api_keys_data.get("gemini_api_key", ""),
-                                        assemblyai_api_key=api_keys_data.get("assemblyai_api_key", ""),
-                                        murf_api_key=api_keys_data.get("murf_api_key", ""),
-                                        murf_voice_id=api_keys_data.get("murf_voice_id", "en-IN-aarav"),
-                                        tavily_api_key=api_keys_data.get("tavily_api_key", "")
-                                    )
-                                    
-                                    # Reinitialize services with user keys
-                                    success = reinitialize_services_with_user_keys(user_config)
-                                    
-                                    if success and assemblyai_streaming_service:
-                                        # Reinitialize the streaming service with the new callback
-                                        try:
-                                            await assemblyai_streaming_service.stop_streaming_transcription()
-                                            assemblyai_streaming_service.set_transcription_callback(transcription_callback)
-                                            
-                                            async def safe_websocket_callback(msg):
-                                                if is_websocket_active and manager.is_connected(websocket):
-                                                    return await manager.send_personal_message(json.dumps(msg), websocket)
-                                                return None
-                                            
-                                            await assemblyai_streaming_service.start_streaming_transcription(
-                                                websocket_callback=safe_websocket_callback
-                                            )
-                                            logger.info(f"[SUCCESS] AssemblyAI streaming reinitialized for session {session_id}")
-                                        except Exception as streaming_error:
-                                            logger.error(f"Failed to reinitialize streaming: {streaming_error}")
-                                    
-                                    if success:
-                                        logger.info(f"[SUCCESS] Services reinitialized with user API keys for session {session_id}")
-                                        response = {
-                                            "type": "api_keys_updated",
-                                            "success": True,
-                                            "message": "API keys updated successfully",
-                                            "streaming_ready": assemblyai_streaming_service is not None,
-                                            "timestamp": datetime.now().isoformat()
-                                        }
-                                    else:
-                                        logger.error(f"[ERROR] Failed to reinitialize services with user API keys for session {session_id}")
-                                        response = {
-                                            "type": "api_keys_updated",
-                                            "success": False,
-                                            "message": "Failed to update API keys",
-                                            "streaming_ready": False,
-                                            "timestamp": datetime.now().isoformat()
-                                        }
-                                    
-                                    await manager.send_personal_message(json.dumps(response), websocket)
+                                    await _apply_api_keys(command_data, session_id, websocket, transcription_callback, safe_websocket_callback)
                                     continue
-                        except json.JSONDecodeError:
+                        except orjson.JSONDecodeError:
                             # Not JSON, treat as regular command
                             pass
                         
@@ -1828,7 +2253,7 @@ async def audio_stream_websocket(websocket: WebSocket):
                                 "message": "Ready to receive audio chunks with real-time transcription",
                                 "status": "streaming_ready"
                             }
-                            await manager.send_personal_message(json.dumps(response), websocket)
+                            await manager.send_json(response, websocket)
                             
                         elif command == "stop_streaming":
                             response = {
@@ -1836,12 +2261,12 @@ async def audio_stream_websocket(websocket: WebSocket):
                                 "message": "Stopping audio stream",
                                 "status": "streaming_stopped"
                             }
-                            await manager.send_personal_message(json.dumps(response), websocket)
+                            await manager.send_json(response, websocket)
                             
                             if assemblyai_streaming_service:
                                 async def safe_stop_callback(msg):
                                     if manager.is_connected(websocket):
-                                        return await manager.send_personal_message(json.dumps(msg), websocket)
+                                        return await manager.send_json(msg, websocket)
                                     return None
                             break
                     
@@ -1851,7 +2276,8 @@ async def audio_stream_websocket(websocket: WebSocket):
                         total_bytes += len(audio_chunk)
                         
                         # Write to file
-                        audio_file.write(audio_chunk)
+                        if audio_writer:
+                            audio_writer.write(audio_chunk)
                         
                         # Send to AssemblyAI for transcription if available
                         if assemblyai_streaming_service and is_websocket_active:
@@ -1863,16 +2289,22 @@ async def audio_stream_websocket(websocket: WebSocket):
                                 "type": "audio_chunk_received",
                                 "chunk_number": chunk_count,
                                 "total_bytes": total_bytes,
-                                "timestamp": datetime.now().isoformat()
+                                "timestamp": time.time()
                             }
-                            await manager.send_personal_message(json.dumps(chunk_response), websocket)
+                            await manager.send_json(chunk_response, websocket)
                 
                 except WebSocketDisconnect:
                     logger.info("WebSocket disconnected during audio streaming")
                     break
                 except Exception as e:
-                    logger.error(f"Error processing audio chunk: {e}")
+                    logger.error("Error processing audio chunk: %s", e)
                     break
+        finally:
+            if audio_writer:
+                try:
+                    await audio_writer.close()
+                except Exception as e:
+                    logger.warning("Failed to write recorded audio %s: %s", audio_filename, e)
         
         # Only send final response if WebSocket is still connected
         if manager.is_connected(websocket):
@@ -1883,56 +2315,87 @@ async def audio_stream_websocket(websocket: WebSocket):
                 "audio_filename": audio_filename,
                 "total_chunks": chunk_count,
                 "total_bytes": total_bytes,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": time.time()
             }
-            await manager.send_personal_message(json.dumps(final_response), websocket)
+            await manager.send_json(final_response, websocket)
         
     except WebSocketDisconnect:
         is_websocket_active = False
         manager.disconnect(websocket)
     except Exception as e:
         is_websocket_active = False
-        logger.error(f"Audio streaming WebSocket error: {e}")
+        logger.error("Audio streaming WebSocket error: %s", e)
         manager.disconnect(websocket)
     finally:
         is_websocket_active = False
+        session_disconnected(session_id)
+
+        # Cancel the in-flight turn; its own cleanup also stops TTS
+        turn_task = session_tasks.pop(session_id, None)
+        if turn_task and not turn_task.done():
+            logger.info("[CLEANUP] Cancelling in-flight LLM streaming for session %s", session_id)
+            turn_task.cancel()
+            try:
+                await turn_task
+            except asyncio.CancelledError:
+                logger.info("[CLEANUP] LLM streaming cancelled for session %s", session_id)
+            except Exception as e:
+                logger.error("Error cancelling LLM streaming task: %s", e)
 
         # Cancel any active TTS tasks for this session
         try:
             if session_id in active_tts_tasks:
-                logger.info(f"[CLEANUP] Cancelling active TTS task for session {session_id}")
+                logger.info("[CLEANUP] Cancelling active TTS task for session %s", session_id)
                 active_tts_tasks[session_id].cancel()
                 try:
                     await active_tts_tasks[session_id]
                 except asyncio.CancelledError:
-                    logger.info(f"[CLEANUP] TTS task cancelled successfully for session {session_id}")
+                    logger.info("[CLEANUP] TTS task cancelled successfully for session %s", session_id)
                 del active_tts_tasks[session_id]
         except Exception as e:
-            logger.error(f"Error cancelling TTS task: {e}")
+            logger.error("Error cancelling TTS task: %s", e)
 
         # Clear processing flag
         try:
-            if session_id in session_processing:
-                session_processing[session_id] = False
-                logger.info(f"[CLEANUP] Cleared processing flag for session {session_id}")
+            if session_id in sessions:
+                sessions[session_id].processing = False
+                logger.info("[CLEANUP] Cleared processing flag for session %s", session_id)
             # Clear session queue on disconnect
             if session_id in session_queues:
                 del session_queues[session_id]
-                logger.info(f"[CLEANUP] Cleared session queue for session {session_id}")
+                logger.info("[CLEANUP] Cleared session queue for session %s", session_id)
         except Exception as e:
-            logger.error(f"Error clearing processing flag: {e}")
+            logger.error("Error clearing processing flag: %s", e)
 
         if assemblyai_streaming_service:
             await assemblyai_streaming_service.stop_streaming_transcription()
 
         # Clean up temporary audio file
         try:
-            if os.path.exists(audio_filepath):
+            if audio_filepath and os.path.exists(audio_filepath):
                 os.unlink(audio_filepath)
-                logger.info(f"[CLEANUP] Cleaned up temporary audio file: {audio_filename}")
+                logger.info("[CLEANUP] Cleaned up temporary audio file: %s", audio_filename)
         except Exception as e:
-            logger.warning(f"Failed to clean up temporary audio file {audio_filename}: {str(e)}")
+            logger.warning("Failed to clean up temporary audio file %s: %s", audio_filename, e)
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    # uvloop (libuv) is markedly faster than the stdlib loop for this I/O-bound app; it isn't available on Windows
+    try:
+        import uvloop  # noqa: F401
+        event_loop = "uvloop"
+    except ImportError:
+        event_loop = "asyncio"
+    
+    # WEB_CONCURRENCY > 1 runs several worker processes; auto-reload only works with a single one
+    uvicorn.run(
+        "main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=settings.web_concurrency,
+        reload=settings.web_concurrency == 1 and settings.reload,
+        loop=event_loop,
+        # Pin the C HTTP parser and the websockets protocol (both from uvicorn[standard]) instead of "auto"
+        http="httptools",
+        ws="websockets"
+    )
@@ -1,36 +1,63 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Dict, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from collections import defaultdict, deque
+from itertools import islice
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+import asyncio
 import logging
-import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from utils.cache import SingleFlight, TTLCache
+from utils.constants import MAX_STORED_MESSAGES
+from utils.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# History updates queued within this window are sent to MongoDB as one bulk_write
+HISTORY_WRITE_BATCH_WINDOW = 0.02
+HISTORY_WRITE_BATCH_MAX_SIZE = 100
+
 
 class DatabaseService:
     def __init__(self, mongodb_url: str = None):
-        self.mongodb_url = mongodb_url or os.getenv("MONGODB_URL")
+        self.mongodb_url = mongodb_url or settings.mongodb_url
         self.client = None
         self.db = None
-        self.in_memory_store = {}
+        # Collection handle bound once at connect instead of resolved via attribute lookup per query
+        self.chat_sessions = None
+        # Fallback store: per-session ring buffers so long sessions can't grow without bound
+        self.in_memory_store = defaultdict(lambda: deque(maxlen=MAX_STORED_MESSAGES))
+        # Hot copy of recently read MongoDB histories; the next utterance re-reads the same session
+        self.history_cache = TTLCache(maxsize=1024, ttl=15 * 60)
+        # Concurrent cache misses for the same session and window share one find_one
+        self._history_reads = SingleFlight()
         self.user_sessions = {}  # Track user sessions for better organization
+        # Pending (UpdateOne, future) pairs for the write micro-batcher
+        self._pending_writes = deque()
+        self._write_batcher: Optional[asyncio.Task] = None
     
     async def connect(self) -> bool:
+        if self.client is not None:
+            return True
         try:
             self.client = AsyncIOMotorClient(self.mongodb_url)
             self.db = self.client.voice_agents
+            self.chat_sessions = self.db.chat_sessions
             await self.client.admin.command('ping')
             logger.info("[SUCCESS] Connected to MongoDB successfully")
+            try:
+                # Every read and write looks sessions up by session_id
+                await self.chat_sessions.create_index("session_id", unique=True)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not create session_id index: {e}")
             return True
         except Exception as e:
             logger.warning(f"⚠️  MongoDB connection failed: {e}")
             logger.info("💾 Using in-memory storage as fallback")
             self.client = None
             self.db = None
+            self.chat_sessions = None
             return False
     
     def is_connected(self) -> bool:
@@ -48,44 +75,77 @@ class DatabaseService:
                 return False
         return False
     
-    async def get_chat_history(self, session_id: str) -> List[Dict]:
-        """Get chat history for a session"""
+    async def get_chat_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Get chat history for a session, optionally only the last `limit` messages"""
         if self.db is not None:
+            # Cached as (limit, messages); a full copy or a larger window can serve a smaller limit
+            cached = self.history_cache.get(session_id)
+            if cached is not None:
+                cached_limit, cached_messages = cached
+                if cached_limit is None or (limit is not None and limit <= cached_limit):
+                    return cached_messages[-limit:] if limit else list(cached_messages)
+            
             try:
-                chat_history = await self.db.chat_sessions.find_one({"session_id": session_id})
-                if chat_history and "messages" in chat_history:
-                    return chat_history["messages"]
-                return []
+                messages = await self._history_reads.do(
+                    (session_id, limit), lambda: self._fetch_history(session_id, limit)
+                )
+                return list(messages)
             except Exception as e:
                 logger.error(f"Failed to get chat history from MongoDB: {str(e)}")
-                return self.in_memory_store.get(session_id, [])
-        else:
-            return self.in_memory_store.get(session_id, [])
+        
+        messages = self.in_memory_store.get(session_id)
+        if not messages:
+            return []
+        if limit:
+            return list(islice(messages, max(0, len(messages) - limit), None))
+        return list(messages)
+    
+    async def _fetch_history(self, session_id: str, limit: Optional[int]) -> List[Dict]:
+        # $slice keeps the transfer bounded no matter how long the session has grown
+        projection = {"messages": {"$slice": -limit}} if limit else None
+        chat_history = await self.chat_sessions.find_one({"session_id": session_id}, projection)
+        messages = chat_history.get("messages", []) if chat_history else []
+        self.history_cache.set(session_id, (limit, messages))
+        return messages
+    
+    def evict_cached_history(self, session_id: str):
+        """Drop the hot copy of a session's history, e.g. once the client has moved to another session"""
+        self.history_cache.pop(session_id)
     
     async def add_message_to_history(self, session_id: str, role: str, content: str) -> bool:
         """Add a message to chat history with improved error handling"""
-        if not session_id or not role or not content:
-            logger.error(f"Invalid parameters for add_message_to_history: session_id={session_id}, role={role}, content_length={len(content) if content else 0}")
+        return await self.add_messages_to_history(session_id, [(role, content)])
+    
+    async def add_messages_to_history(self, session_id: str, messages: List[Tuple[str, str]]) -> bool:
+        """Append several (role, content) messages to a session in a single MongoDB update"""
+        if not session_id or not messages or not all(role and content for role, content in messages):
+            logger.error(f"Invalid parameters for add_messages_to_history: session_id={session_id}, message_count={len(messages) if messages else 0}")
             return False
             
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now()
-        }
+        now = datetime.now()
+        new_messages = [
+            {
+                "role": role,
+                "content": content,
+                "timestamp": now
+            }
+            for role, content in messages
+        ]
         
         # Track user sessions for analytics
         if session_id not in self.user_sessions:
             self.user_sessions[session_id] = {
-                "created_at": datetime.now(),
+                "created_at": now,
                 "message_count": 0,
-                "last_activity": datetime.now()
+                "last_activity": now
             }
         
-        self.user_sessions[session_id]["message_count"] += 1
-        self.user_sessions[session_id]["last_activity"] = datetime.now()
+        self.user_sessions[session_id]["message_count"] += len(new_messages)
+        self.user_sessions[session_id]["last_activity"] = now
+        summary = ", ".join(f"{role} - {content[:50]}..." for role, content in messages)
         
         if self.db is not None:
+            cached_before = self.history_cache.get(session_id)
             try:
                 # Update chat session with user session metadata
                 session_metadata = {
@@ -95,47 +155,99 @@ class DatabaseService:
                     "last_activity": self.user_sessions[session_id]["last_activity"]
                 }
                 
-                result = await self.db.chat_sessions.update_one(
+                await self._queue_write(UpdateOne(
                     {"session_id": session_id},
                     {
-                        "$push": {"messages": message},
+                        # $slice keeps only the newest messages, so the document can't grow without bound
+                        "$push": {"messages": {"$each": new_messages, "$slice": -MAX_STORED_MESSAGES}},
                         "$set": {
-                            "last_updated": datetime.now(),
+                            "last_updated": now,
                             **session_metadata
                         }
                     },
                     upsert=True
-                )
+                ))
+                self._append_to_cached_history(session_id, cached_before, new_messages)
                 
-                if result.matched_count > 0 or result.upserted_id:
-                    logger.info(f"[SUCCESS] Message saved to MongoDB for session {session_id}: {role} - {content[:50]}...")
-                else:
-                    logger.warning(f"⚠️ MongoDB update didn't match any documents for session {session_id}")
-                    
+                logger.info(f"[SUCCESS] {len(new_messages)} message(s) saved to MongoDB for session {session_id}: {summary}")
                 return True
             except Exception as e:
                 logger.error(f"❌ Failed to save message to MongoDB: {str(e)}")
+                self.history_cache.pop(session_id)
                 # Fallback to in-memory storage
-                if session_id not in self.in_memory_store:
-                    self.in_memory_store[session_id] = []
-                self.in_memory_store[session_id].append(message)
-                logger.info(f"💾 Message saved to in-memory storage for session {session_id}: {role} - {content[:50]}...")
+                self.in_memory_store[session_id].extend(new_messages)
+                logger.info(f"💾 Message(s) saved to in-memory storage for session {session_id}: {summary}")
                 return True
         else:
             # In-memory storage when MongoDB is not available
-            if session_id not in self.in_memory_store:
-                self.in_memory_store[session_id] = []
-            self.in_memory_store[session_id].append(message)
-            logger.info(f"💾 Message saved to in-memory storage for session {session_id}: {role} - {content[:50]}...")
+            self.in_memory_store[session_id].extend(new_messages)
+            logger.info(f"💾 Message(s) saved to in-memory storage for session {session_id}: {summary}")
             return True
     
+    def _append_to_cached_history(self, session_id: str, cached_before, new_messages: List[Dict]):
+        """Write-through: extend the cached history with what was just saved instead of dropping it"""
+        cached = self.history_cache.get(session_id)
+        if cached is None:
+            return
+        if cached is not cached_before:
+            # Re-read while the write was queued; it may or may not include these messages
+            self.history_cache.pop(session_id)
+            return
+        
+        cached_limit, cached_messages = cached
+        # A window of the last N messages is still exactly that after appending and trimming;
+        # a full copy is trimmed the same way the $push $slice trims the stored document
+        messages = (cached_messages + new_messages)[-(cached_limit or MAX_STORED_MESSAGES):]
+        self.history_cache.set(session_id, (cached_limit, messages))
+    
+    async def _queue_write(self, operation: UpdateOne):
+        future = asyncio.get_running_loop().create_future()
+        self._pending_writes.append((operation, future))
+        if self._write_batcher is None or self._write_batcher.done():
+            self._write_batcher = asyncio.create_task(self._run_write_batcher())
+        await future
+    
+    async def _run_write_batcher(self):
+        """Flush queued updates every HISTORY_WRITE_BATCH_WINDOW in a single round trip"""
+        while self._pending_writes:
+            await asyncio.sleep(HISTORY_WRITE_BATCH_WINDOW)
+            
+            batch = []
+            while self._pending_writes and len(batch) < HISTORY_WRITE_BATCH_MAX_SIZE:
+                batch.append(self._pending_writes.popleft())
+            
+            # Ordered, so several writes to one session keep their message order;
+            # MongoDB stops at the first failure and everything from there on is reported as failed
+            failed_from = len(batch)
+            error = None
+            try:
+                await self.chat_sessions.bulk_write([operation for operation, _ in batch], ordered=True)
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors") or []
+                failed_from = write_errors[0]["index"] if write_errors else 0
+                error = e
+            except Exception as e:
+                failed_from = 0
+                error = e
+            
+            if error is not None:
+                logger.error(f"❌ Bulk history write failed for {len(batch) - failed_from}/{len(batch)} update(s): {str(error)}")
+            
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if index < failed_from:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+    
     async def get_all_sessions(self) -> List[Dict]:
         """Get all chat sessions with metadata"""
         sessions = []
         
         if self.db is not None:
             try:
-                cursor = self.db.chat_sessions.find(
+                cursor = self.chat_sessions.find(
                     {},
                     {
                         "session_id": 1,
@@ -209,9 +321,10 @@ class DatabaseService:
 
     async def clear_session_history(self, session_id: str) -> bool:
         """Clear chat history for a specific session"""
+        self.history_cache.pop(session_id)
         if self.db is not None:
             try:
-                result = await self.db.chat_sessions.delete_one({"session_id": session_id})
+                result = await self.chat_sessions.delete_one({"session_id": session_id})
                 logger.info(f"Cleared chat history for session {session_id}")
                 return result.deleted_count > 0
             except Exception as e:
@@ -227,6 +340,9 @@ class DatabaseService:
             return True
     
     async def close(self):
+        # Let queued history writes reach MongoDB before the client goes away
+        if self._write_batcher is not None and not self._write_batcher.done():
+            await self._write_batcher
         if self.client:
             self.client.close()
             logger.info("Database connection closed")
@@ -1,9 +1,50 @@
+import asyncio
 import google.generativeai as genai
+import hashlib
 from typing import List, Dict, Optional, AsyncGenerator
 import logging
 
+from utils.cache import SingleFlight
+from utils.constants import HISTORY_CONTEXT_LIMIT
+from utils.upstream import gemini_guard
+
 logger = logging.getLogger(__name__)
 
+# Concurrent requests with an identical prompt share one Gemini call
+_response_inflight = SingleFlight()
+
+# Speaker labels used when replaying chat history into the prompt; anything else is the assistant
+_ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+
+# Static prompt scaffolding, built once at import; only the per-request parts are interpolated
+WEB_SEARCH_EMPTY_CONTEXT = (
+    "\n\nWEB SEARCH STATUS: No reliable search results were found for this query.\n"
+    "INSTRUCTION: Politely inform the user that you couldn't find reliable current information on this topic. You can still provide general knowledge if appropriate, but mention that you weren't able to find recent/reliable web sources.\n"
+)
+
+WEB_SEARCH_INSTRUCTIONS = """INSTRUCTIONS FOR WEB SEARCH RESULTS:
+1. Extract only the most relevant, reliable information from these search results
+2. Summarize the findings into a clear, conversational response with key points
+3. ALWAYS include actual URLs when citing sources - do NOT use "this link" placeholders
+4. If the search results don't contain useful information, politely say you couldn't find reliable results
+5. Keep responses concise, factual, and user-friendly
+6. Always prioritize clarity and relevance over raw data
+7. Format your response with bullet points or numbered lists when appropriate
+8. ALWAYS end with sources section: "📌 Sources: [Title]: [URL]" format using the actual URLs provided
+9. Use the exact URLs from the search results provided above
+
+"""
+
+PROMPT_TEMPLATE = """{persona_prompt}
+
+IMPORTANT: Always answer the CURRENT user question directly in character. Do not give generic responses about your capabilities unless specifically asked "what can you do".
+
+User's current question: "{user_message}"
+
+{history_context}{web_context}
+
+Please provide a specific, helpful answer to the user's current question while maintaining your character/persona. Keep your response under 3000 characters."""
+
 
 class LLMService:    
     def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash"):
@@ -29,64 +70,39 @@ class LLMService:
         if not messages:
             return ""
         
-        formatted_history = "\n\nPrevious conversation context:\n"
-        for msg in messages[-10:]:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            formatted_history += f"{role}: {msg['content']}\n"
-        
-        return formatted_history
+        parts = ["\n\nPrevious conversation context:\n"]
+        parts.extend(
+            f"{_ROLE_LABELS.get(msg['role'], 'Assistant')}: {msg['content']}\n"
+            for msg in messages[-HISTORY_CONTEXT_LIMIT:]
+        )
+        return "".join(parts)
     
+    def _build_prompt(self, user_message: str, chat_history: List[Dict], persona: str = "developer", web_search_results: str = None) -> str:
+        """Assemble the persona, history and web-search context into one Gemini prompt"""
+        history_context = self.format_chat_history_for_llm(chat_history)
+        persona_prompt = self.get_persona_prompt(persona)
+        
+        # Add web search context if available
+        web_context = ""
+        if web_search_results:
+            if "No web search results found" in web_search_results:
+                web_context = WEB_SEARCH_EMPTY_CONTEXT
+            else:
+                web_context = f"\n\nCURRENT WEB SEARCH RESULTS:\n{web_search_results}\n{WEB_SEARCH_INSTRUCTIONS}"
+        
+        return PROMPT_TEMPLATE.format(
+            persona_prompt=persona_prompt,
+            user_message=user_message,
+            history_context=history_context,
+            web_context=web_context
+        )
+
     async def generate_response(self, user_message: str, chat_history: List[Dict], persona: str = "developer", web_search_results: str = None) -> str:
         try:
-            history_context = self.format_chat_history_for_llm(chat_history)
-            persona_prompt = self.get_persona_prompt(persona)
-            
-            # Add web search context if available
-            web_context = ""
-            if web_search_results:
-                if "No web search results found" in web_search_results:
-                    web_context = f"\n\nWEB SEARCH STATUS: No reliable search results were found for this query.\n"
-                    web_context += "INSTRUCTION: Politely inform the user that you couldn't find reliable current information on this topic. You can still provide general knowledge if appropriate, but mention that you weren't able to find recent/reliable web sources.\n"
-                else:
-                    web_context = f"\n\nCURRENT WEB SEARCH RESULTS:\n{web_search_results}\n"
-                    web_context += """INSTRUCTIONS FOR WEB SEARCH RESULTS:
-1. Extract only the most relevant, reliable information from these search results
-2. Summarize the findings into a clear, conversational response with key points
-3. ALWAYS include actual URLs when citing sources - do NOT use "this link" placeholders
-4. If the search results don't contain useful information, politely say you couldn't find reliable results
-5. Keep responses concise, factual, and user-friendly
-6. Always prioritize clarity and relevance over raw data
-7. Format your response with bullet points or numbered lists when appropriate
-8. ALWAYS end with sources section: "📌 Sources: [Title]: [URL]" format using the actual URLs provided
-9. Use the exact URLs from the search results provided above
-
-"""
-            
-            llm_prompt = f"""{persona_prompt}
-
-IMPORTANT: Always answer the CURRENT user question directly in character. Do not give generic responses about your capabilities unless specifically asked "what can you do".
-
-User's current question: "{user_message}"
-
-{history_context}{web_context}
-
-Please provide a specific, helpful answer to the user's current question while maintaining your character/persona. Keep your response under 3000 characters."""
-            
-            llm_response = self.model.generate_content(llm_prompt)
-            
-            if not llm_response.candidates:
-                raise Exception("No response candidates generated from LLM")
-            
-            response_text = ""
-            for part in llm_response.candidates[0].content.parts:
-                if hasattr(part, 'text'):
-                    response_text += part.text
-            
-            if not response_text.strip():
-                raise Exception("Empty response text from LLM")
-            
-            response_text = response_text.strip()
-            return response_text
+            llm_prompt = self._build_prompt(user_message, chat_history, persona, web_search_results)
+            # Keyed per API key too, so one user's quota or auth error is never handed to another
+            key = hashlib.sha256(f"{self.api_key}\0{self.model_name}\0{llm_prompt}".encode("utf-8")).hexdigest()
+            return await _response_inflight.do(key, lambda: self._generate_text(llm_prompt))
             
         except Exception as e:
             error_msg = str(e)
@@ -102,60 +118,57 @@ Please provide a specific, helpful answer to the user's current question while m
             else:
                 raise
 
+    async def _generate_text(self, llm_prompt: str) -> str:
+        # The SDK call is blocking; run it in a worker thread so the event loop stays responsive
+        async with gemini_guard:
+            llm_response = await asyncio.to_thread(self.model.generate_content, llm_prompt)
+        
+        if not llm_response.candidates:
+            raise Exception("No response candidates generated from LLM")
+        
+        response_text = ""
+        for part in llm_response.candidates[0].content.parts:
+            if hasattr(part, 'text'):
+                response_text += part.text
+        
+        if not response_text.strip():
+            raise Exception("Empty response text from LLM")
+        
+        return response_text.strip()
+
     async def generate_streaming_response(self, user_message: str, chat_history: List[Dict], persona: str = "developer", web_search_results: str = None) -> AsyncGenerator[str, None]:
         """Generate a streaming response from the LLM"""
         try:
-            history_context = self.format_chat_history_for_llm(chat_history)
-            persona_prompt = self.get_persona_prompt(persona)
-            
-            # Add web search context if available
-            web_context = ""
-            if web_search_results:
-                if "No web search results found" in web_search_results:
-                    web_context = f"\n\nWEB SEARCH STATUS: No reliable search results were found for this query.\n"
-                    web_context += "INSTRUCTION: Politely inform the user that you couldn't find reliable current information on this topic. You can still provide general knowledge if appropriate, but mention that you weren't able to find recent/reliable web sources.\n"
-                else:
-                    web_context = f"\n\nCURRENT WEB SEARCH RESULTS:\n{web_search_results}\n"
-                    web_context += """INSTRUCTIONS FOR WEB SEARCH RESULTS:
-1. Extract only the most relevant, reliable information from these search results
-2. Summarize the findings into a clear, conversational response with key points
-3. ALWAYS include actual URLs when citing sources - do NOT use "this link" placeholders
-4. If the search results don't contain useful information, politely say you couldn't find reliable results
-5. Keep responses concise, factual, and user-friendly
-6. Always prioritize clarity and relevance over raw data
-7. Format your response with bullet points or numbered lists when appropriate
-8. ALWAYS end with sources section: "📌 Sources: [Title]: [URL]" format using the actual URLs provided
-9. Use the exact URLs from the search results provided above
-
-"""
-            
-            llm_prompt = f"""{persona_prompt}
-
-IMPORTANT: Always answer the CURRENT user question directly in character. Do not give generic responses about your capabilities unless specifically asked "what can you do".
-
-User's current question: "{user_message}"
-
-{history_context}{web_context}
-
-Please provide a specific, helpful answer to the user's current question while maintaining your character/persona. Keep your response under 3000 characters."""
-            
-            # Generate response with streaming
-            response_stream = self.model.generate_content(llm_prompt, stream=True)
+            llm_prompt = self._build_prompt(user_message, chat_history, persona, web_search_results)
             
+            # Generate response with streaming. The guard is held until the stream is drained, so
+            # its cap bounds concurrent Gemini streams rather than just stream starts
             accumulated_response = ""
-            try:
-                # Use regular iteration for Google Generative AI streaming
-                for chunk in response_stream:
-                    if chunk.candidates and len(chunk.candidates) > 0:
-                        candidate = chunk.candidates[0]
-                        if candidate.content and candidate.content.parts:
-                            for part in candidate.content.parts:
-                                if hasattr(part, 'text') and part.text:
-                                    accumulated_response += part.text
-                                    yield part.text
-            except Exception as stream_error:
-                logger.error(f"Error during streaming iteration: {stream_error}")
-                # Fallback to non-streaming response
+            stream_failed = False
+            async with gemini_guard:
+                response_stream = await asyncio.to_thread(self.model.generate_content, llm_prompt, stream=True)
+                
+                try:
+                    # The SDK stream is a blocking iterator; pull each chunk in a worker thread
+                    # so waiting on Gemini doesn't stall the other sessions on the event loop
+                    chunk_iterator = iter(response_stream)
+                    while True:
+                        chunk = await asyncio.to_thread(next, chunk_iterator, None)
+                        if chunk is None:
+                            break
+                        if chunk.candidates and len(chunk.candidates) > 0:
+                            candidate = chunk.candidates[0]
+                            if candidate.content and candidate.content.parts:
+                                for part in candidate.content.parts:
+                                    if hasattr(part, 'text') and part.text:
+                                        accumulated_response += part.text
+                                        yield part.text
+                except Exception as stream_error:
+                    logger.error(f"Error during streaming iteration: {stream_error}")
+                    stream_failed = True
+            
+            if stream_failed:
+                # Fallback to non-streaming response; it takes its own guard slot, so this one is released first
                 logger.info("Falling back to non-streaming response")
                 fallback_response = await self.generate_response(user_message, chat_history, persona, web_search_results)
                 yield fallback_response
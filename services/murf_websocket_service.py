@@ -1,15 +1,72 @@
 import asyncio
 import websockets
-import json
+import orjson
 import base64
-import uuid
+import secrets
 from typing import Optional, AsyncGenerator
 import logging
 import os
-from datetime import datetime
+import re
+import time
 
 logger = logging.getLogger(__name__)
 
+# Everything up to and including the last sentence terminator followed by whitespace
+SENTENCE_BOUNDARY_RE = re.compile(r".*[.!?]\s+", re.DOTALL)
+
+# Before the first sentence completes, a clause break is good enough to start speaking once
+# this much text is buffered; it gets the first audio out sooner on long opening sentences
+SOFT_BOUNDARY_RE = re.compile(r".*[,;:]\s+|.*\n", re.DOTALL)
+FIRST_SEGMENT_MIN_CHARS = 40
+
+
+# Until it is known whether Murf flags "final" per text message or once per context, a silence
+# this long after the end message and a "final" also ends the stream
+FINAL_GRACE_TIMEOUT = 2.0
+
+
+class _ContextProgress:
+    """Text messages sent on a Murf context against the "final" flags received for it"""
+    
+    def __init__(self, final_per_message: Optional[bool]):
+        # None until a multi-sentence reply has shown how Murf flags "final"
+        self.final_per_message = final_per_message
+        self.segments_sent = 0
+        self.finals_received = 0
+        # Set once the end: True message has gone out (or failed to)
+        self.ended = False
+        self.grace_expired = False
+    
+    @property
+    def complete(self) -> bool:
+        if not self.ended:
+            return False
+        if self.final_per_message is False:
+            return self.finals_received >= 1
+        return self.finals_received >= self.segments_sent
+    
+    @property
+    def in_grace(self) -> bool:
+        return self.final_per_message is None and self.ended and self.finals_received > 0
+    
+    def learned_final_per_message(self) -> Optional[bool]:
+        """What this context showed about Murf's "final" flags, if anything"""
+        if self.finals_received > 1:
+            return True
+        if self.grace_expired and self.finals_received == 1 and self.segments_sent > 1:
+            return False
+        return None
+
+
+def _dumps(message: dict) -> str:
+    # Murf expects text frames; orjson encodes the per-sentence and control messages much faster than json
+    return orjson.dumps(message).decode()
+
+
+def _new_context_id() -> str:
+    # Same 8 hex chars as before, without building and formatting a full uuid4
+    return f"voice_agent_context_{secrets.token_hex(4)}"
+
 
 class MurfWebSocketService:
     """Murf WebSocket TTS service for streaming text-to-speech"""
@@ -26,6 +83,8 @@ class MurfWebSocketService:
         # Add a lock to prevent concurrent recv() calls
         self._recv_lock = asyncio.Lock()
         self._connecting = False
+        # Whether Murf sends "final" after every text message (True) or once per context (False)
+        self._final_per_message: Optional[bool] = None
         
     async def connect(self):
         """Establish WebSocket connection to Murf"""
@@ -48,38 +107,21 @@ class MurfWebSocketService:
             await self._send_voice_config()
             
         except Exception as e:
-            logger.error(f"Failed to connect to Murf WebSocket: {str(e)}")
+            logger.error("Failed to connect to Murf WebSocket: %s", e)
             self.is_connected = False
             raise
         finally:
             self._connecting = False
     
-    async def ensure_connected(self):
-        """Ensure WebSocket is connected, reconnect if necessary"""
-        if not self.is_connected or not self.websocket or self.websocket.closed:
-            logger.info("WebSocket not connected, attempting to reconnect...")
-            await self.connect()
-        elif self.websocket.open:
-            # Test connection with a ping
-            try:
-                await self.websocket.ping()
-                logger.debug("WebSocket connection is healthy")
-            except Exception as e:
-                logger.warning(f"WebSocket ping failed: {e}, reconnecting...")
-                await self.connect()
-        else:
-            logger.info("WebSocket connection state unknown, reconnecting...")
-            await self.connect()
-    
     async def _send_voice_config(self, context_id: str = None):
         """Send voice configuration to Murf WebSocket"""
         try:
             if context_id is None:
-                context_id = f"voice_agent_context_{uuid.uuid4().hex[:8]}"
+                context_id = _new_context_id()
             
             # Always clear all contexts before creating a new one to prevent limit exceeded
             if self.active_contexts:
-                logger.info(f"Clearing {len(self.active_contexts)} active contexts before creating new one")
+                logger.info("Clearing %s active contexts before creating new one", len(self.active_contexts))
                 await self._clear_all_contexts()
             
             self.current_context_id = context_id
@@ -95,22 +137,22 @@ class MurfWebSocketService:
                 },
                 "context_id": context_id
             }
-            logger.info(f"Sending voice config with context_id: {context_id}")
-            await self.websocket.send(json.dumps(voice_config_msg))
+            logger.info("Sending voice config with context_id: %s", context_id)
+            await self.websocket.send(_dumps(voice_config_msg))
             
             # Wait for acknowledgment with shorter timeout
             try:
                 async with self._recv_lock:
                     response = await asyncio.wait_for(self.websocket.recv(), timeout=3.0)
-                    data = json.loads(response)
-                    logger.info(f"Voice config response: {data}")
+                    data = orjson.loads(response)
+                    logger.info("Voice config response: %s", data)
                     
                     # Check for context limit exceeded error
                     if "error" in data and "Exceeded Active context limit" in data["error"]:
-                        logger.warning(f"Context limit exceeded, clearing all contexts and retrying")
+                        logger.warning("Context limit exceeded, clearing all contexts and retrying")
                         await self._clear_all_contexts()
                         # Retry with a new context ID after clearing
-                        new_context_id = f"voice_agent_context_{uuid.uuid4().hex[:8]}"
+                        new_context_id = _new_context_id()
                         await self._send_voice_config(new_context_id)
                         return
                         
@@ -119,7 +161,7 @@ class MurfWebSocketService:
                 # Don't fail here, continue with TTS processing
             
         except Exception as e:
-            logger.error(f"Failed to send voice config: {str(e)}")
+            logger.error("Failed to send voice config: %s", e)
             raise
     
     async def ensure_connected(self):
@@ -151,7 +193,7 @@ class MurfWebSocketService:
                 self.is_connected = False
                 logger.info("Disconnected from Murf WebSocket")
         except Exception as e:
-            logger.error(f"Error disconnecting from Murf WebSocket: {str(e)}")
+            logger.error("Error disconnecting from Murf WebSocket: %s", e)
     
     async def stream_text_to_audio(self, text_stream: AsyncGenerator[str, None], session_id: str = None) -> AsyncGenerator[dict, None]:
         """
@@ -162,50 +204,63 @@ class MurfWebSocketService:
         
         try:
             # Generate a unique context ID for this session to avoid conflicts
-            context_id = f"voice_agent_context_{uuid.uuid4().hex[:8]}"
+            context_id = _new_context_id()
             
             # Always ensure we have a fresh context for each request
             await self._send_voice_config(context_id)
             
-            accumulated_text = ""
-            chunk_count = 0
-            
-            # Collect all text chunks first
-            text_chunks = []
-            async for text_chunk in text_stream:
-                if text_chunk:
-                    text_chunks.append(text_chunk)
-                    accumulated_text += text_chunk
-                    chunk_count += 1
-            
-            logger.info(f"Collected {chunk_count} text chunks, total length: {len(accumulated_text)}")
-            
-            # Send all text in one message (better for TTS quality)
-            text_msg = {
-                "context_id": context_id,
-                "text": accumulated_text,
-                "end": True  # End context immediately after sending to free up resources
-            }
-            
-            logger.info(f"Sending complete text ({len(accumulated_text)} chars): {accumulated_text[:100]}...")
-            await self.websocket.send(json.dumps(text_msg))
+            # Forward sentence-sized pieces while the LLM is still streaming so Murf
+            # can start synthesising the first sentence before the reply is complete
+            progress = _ContextProgress(self._final_per_message)
+            sender = asyncio.create_task(self._send_text_stream(text_stream, context_id, progress))
             
             # Listen for audio responses with timeout
             audio_received = False
             timeout_count = 0
             max_timeouts = 2
             
-            async for audio_response in self._listen_for_audio_with_timeout():
-                audio_received = True
-                yield audio_response
-                # Break on final audio chunk
-                if audio_response.get("type") == "audio_chunk" and audio_response.get("is_final"):
-                    break
-                elif audio_response.get("type") == "timeout":
-                    timeout_count += 1
-                    if timeout_count >= max_timeouts:
-                        logger.error(f"Too many timeouts ({timeout_count}), giving up on TTS")
+            listener = self._listen_for_audio_with_timeout(progress)
+            next_response = None
+            try:
+                while True:
+                    next_response = asyncio.ensure_future(listener.__anext__())
+                    # Wait on the sender too, so a failed LLM stream surfaces straight away
+                    # instead of after Murf's receive timeouts
+                    if not sender.done():
+                        await asyncio.wait((next_response, sender), return_when=asyncio.FIRST_COMPLETED)
+                        if sender.done() and not sender.cancelled() and sender.exception():
+                            raise sender.exception()
+                    try:
+                        audio_response = await next_response
+                    except StopAsyncIteration:
                         break
+                    
+                    audio_received = True
+                    yield audio_response
+                    # Break on final audio chunk
+                    if audio_response.get("type") == "audio_chunk" and audio_response.get("is_final"):
+                        break
+                    elif audio_response.get("type") == "timeout":
+                        timeout_count += 1
+                        if timeout_count >= max_timeouts:
+                            logger.error("Too many timeouts (%s), giving up on TTS", timeout_count)
+                            break
+            finally:
+                # The generator can't be closed while a receive is still running inside it
+                if next_response is not None and not next_response.done():
+                    next_response.cancel()
+                    await asyncio.wait((next_response,))
+                await listener.aclose()
+            
+            if self._final_per_message is None:
+                self._final_per_message = progress.learned_final_per_message()
+            
+            # Surface any text streaming error once audio listening has finished; once the
+            # end message is out the sender is only finishing up, so let it rather than cancel it
+            if sender.done() or progress.ended:
+                await sender
+            else:
+                sender.cancel()
             
             if not audio_received:
                 logger.error("No audio chunks received from Murf WebSocket")
@@ -214,12 +269,14 @@ class MurfWebSocketService:
             # Immediately clear the context after successful completion
             try:
                 await self._clear_specific_context(context_id)
-                logger.info(f"Successfully cleared context {context_id} after TTS completion")
+                logger.info("Successfully cleared context %s after TTS completion", context_id)
             except Exception as e:
-                logger.warning(f"Failed to clear context {context_id} after completion: {e}")
+                logger.warning("Failed to clear context %s after completion: %s", context_id, e)
             
         except Exception as e:
-            logger.error(f"Error in stream_text_to_audio: {str(e)}")
+            logger.error("Error in stream_text_to_audio: %s", e)
+            if 'sender' in locals() and not sender.done():
+                sender.cancel()
             # Try to clear the context even on error
             try:
                 if 'context_id' in locals():
@@ -228,29 +285,86 @@ class MurfWebSocketService:
                 pass
             raise
     
+    async def _send_text_stream(self, text_stream: AsyncGenerator[str, None], context_id: str, progress: _ContextProgress):
+        """Send streamed text to Murf one complete sentence at a time, then end the context"""
+        pending_text = ""
+        chunk_count = 0
+        sent_count = 0
+        try:
+            async for text_chunk in text_stream:
+                if not text_chunk:
+                    continue
+                chunk_count += 1
+                pending_text += text_chunk
+                
+                match = SENTENCE_BOUNDARY_RE.match(pending_text)
+                if not match and sent_count == 0 and len(pending_text) >= FIRST_SEGMENT_MIN_CHARS:
+                    match = SOFT_BOUNDARY_RE.match(pending_text)
+                if match:
+                    sentences = pending_text[:match.end()]
+                    pending_text = pending_text[match.end():]
+                    await self.websocket.send(_dumps({
+                        "context_id": context_id,
+                        "text": sentences,
+                        "end": False
+                    }))
+                    sent_count += 1
+                    progress.segments_sent += 1
+        finally:
+            # Always end the context so Murf flushes the remaining audio and frees it.
+            # This also runs while cancelling or with the socket gone, so a failure here
+            # must not replace the exception that got us here
+            try:
+                await self.websocket.send(_dumps({
+                    "context_id": context_id,
+                    "text": pending_text,
+                    "end": True
+                }))
+                if pending_text:
+                    progress.segments_sent += 1
+                logger.info("Streamed %s text chunks to Murf in %s messages", chunk_count, sent_count + 1)
+            except Exception as e:
+                logger.warning("Failed to end Murf context %s: %s", context_id, e)
+            finally:
+                progress.ended = True
+    
     def get_current_context_id(self) -> Optional[str]:
         """Get the current context ID"""
         return self.current_context_id
     
-    async def _listen_for_audio_with_timeout(self) -> AsyncGenerator[dict, None]:
-        """Listen for audio with better timeout handling"""
+    async def _listen_for_audio_with_timeout(self, progress: Optional[_ContextProgress] = None) -> AsyncGenerator[dict, None]:
+        """Listen for audio with better timeout handling
+
+        With `progress`, Murf's "final" flag only ends the stream once the end: True message has
+        gone out and a "final" has come back for every text message sent; an earlier "final" may
+        belong to one sentence while later ones are still being voiced.
+        """
         audio_chunk_count = 0
         total_audio_size = 0
         
         try:
             while True:
+                # After the end message and at least one "final", a short silence means Murf is done
+                in_grace = progress is not None and progress.in_grace
                 try:
                     # Use recv lock to prevent concurrent recv() calls
                     async with self._recv_lock:
-                        response = await asyncio.wait_for(self.websocket.recv(), timeout=30.0)  # Reduced timeout for better responsiveness
+                        response = await asyncio.wait_for(
+                            self.websocket.recv(),
+                            timeout=FINAL_GRACE_TIMEOUT if in_grace else 30.0  # Reduced timeout for better responsiveness
+                        )
                     
-                    data = json.loads(response)
-                    logger.debug(f"📥 Received response: {list(data.keys())}")
+                    data = orjson.loads(response)
+                    logger.debug("📥 Received response: %s", list(data.keys()))
                     
                     if "audio" in data:
                         audio_chunk_count += 1
                         audio_base64 = data["audio"]
                         total_audio_size += len(audio_base64)
+                        is_final = data.get("final", False)
+                        if is_final and progress is not None:
+                            progress.finals_received += 1
+                            is_final = progress.complete
                         
                         # Yield the response
                         yield {
@@ -260,38 +374,42 @@ class MurfWebSocketService:
                             "chunk_number": audio_chunk_count,
                             "chunk_size": len(audio_base64),
                             "total_size": total_audio_size,
-                            "timestamp": datetime.now().isoformat(),
-                            "is_final": data.get("final", False)
+                            "timestamp": time.time(),
+                            "is_final": is_final
                         }
                         
                         # Check if this is the final audio chunk
-                        if data.get("final"):
-                            logger.info(f"Received final audio chunk. Total chunks: {audio_chunk_count}, Total size: {total_audio_size}")
+                        if is_final:
+                            logger.info("Received final audio chunk. Total chunks: %s, Total size: %s", audio_chunk_count, total_audio_size)
                             break
                     
                     elif "error" in data:
-                        logger.error(f"Murf WebSocket error: {data['error']}")
+                        logger.error("Murf WebSocket error: %s", data['error'])
                         yield {
                             "type": "error",
                             "error": data["error"],
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": time.time()
                         }
                         break
                     
                     else:
                         # Non-audio response
-                        logger.debug(f"Received non-audio response: {data}")
+                        logger.debug("Received non-audio response: %s", data)
                         yield {
                             "type": "status",
                             "data": data,
-                            "timestamp": datetime.now().isoformat()
+                            "timestamp": time.time()
                         }
                 
                 except asyncio.TimeoutError:
+                    if in_grace:
+                        progress.grace_expired = True
+                        logger.info("No more audio after the final chunk. Total chunks: %s, Total size: %s", audio_chunk_count, total_audio_size)
+                        break
                     logger.warning("Timeout waiting for Murf response")
                     yield {
                         "type": "timeout",
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": time.time()
                     }
                     # Continue waiting for a bit more
                     continue
@@ -302,96 +420,22 @@ class MurfWebSocketService:
                     break
                     
                 except Exception as e:
-                    logger.error(f"Error receiving response: {str(e)}")
+                    logger.error("Error receiving response: %s", e)
                     yield {
                         "type": "error", 
                         "error": str(e),
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": time.time()
                     }
                     break
         
         except Exception as e:
-            logger.error(f"Fatal error in audio listening: {str(e)}")
+            logger.error("Fatal error in audio listening: %s", e)
             yield {
                 "type": "error",
                 "error": f"Fatal error: {str(e)}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": time.time()
             }
     
-    async def _listen_for_audio(self) -> AsyncGenerator[dict, None]:
-        audio_chunk_count = 0
-        total_audio_size = 0
-        
-        try:
-            while True:
-                try:
-                    # Use recv lock to prevent concurrent recv() calls
-                    async with self._recv_lock:
-                        response = await asyncio.wait_for(self.websocket.recv(), timeout=90.0)  # Increased timeout for TTS processing
-                    
-                    data = json.loads(response)
-                    # logger.info(f"📥 Received response: {list(data.keys())}")
-                    
-                    if "audio" in data:
-                        audio_chunk_count += 1
-                        audio_base64 = data["audio"]
-                        total_audio_size += len(audio_base64)
-                        
-                        # Yield the response
-                        yield {
-                            "type": "audio_chunk",
-                            "audio_base64": audio_base64,
-                            "context_id": data.get("context_id"),
-                            "chunk_number": audio_chunk_count,
-                            "chunk_size": len(audio_base64),
-                            "total_size": total_audio_size,
-                            "timestamp": datetime.now().isoformat(),
-                            "is_final": data.get("final", False)
-                        }
-                        
-                        # Check if this is the final audio chunk
-                        if data.get("final"):
-                            logger.info(f"Received final audio chunk. Total chunks: {audio_chunk_count}, Total size: {total_audio_size}")
-                            break
-                    
-                    else:
-                        # Non-audio response
-                        # logger.info(f"Received non-audio response: {data}")
-                        yield {
-                            "type": "status",
-                            "data": data,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                
-                except asyncio.TimeoutError:
-                    logger.warning("Timeout waiting for Murf response - attempting reconnection")
-                    # Try to reconnect if we timeout
-                    try:
-                        await self.connect()
-                        logger.info("Reconnected to Murf WebSocket after timeout")
-                        # Continue listening after reconnection
-                        continue
-                    except Exception as reconnect_error:
-                        logger.error(f"Failed to reconnect: {reconnect_error}")
-                        break
-                except websockets.exceptions.ConnectionClosed:
-                    logger.warning("WebSocket connection closed unexpectedly")
-                    self.is_connected = False
-                    break
-                except Exception as e:
-                    logger.error(f"Error receiving response: {str(e)}")
-                    break
-                except websockets.exceptions.ConnectionClosed:
-                    logger.info("Murf WebSocket connection closed")
-                    break
-                except Exception as e:
-                    logger.error(f"Error receiving from Murf WebSocket: {str(e)}")
-                    break
-            
-        except Exception as e:
-            logger.error(f"Error in _listen_for_audio (total chunks processed: {audio_chunk_count}): {str(e)}")
-            raise
-    
     async def clear_context(self):
         """Clear the current context - wrapper for backward compatibility"""
         if self.current_context_id:
@@ -408,17 +452,17 @@ class MurfWebSocketService:
                 "clear": True
             }
             
-            logger.info(f"Clearing Murf context: {context_id}")
-            await self.websocket.send(json.dumps(clear_msg))
+            logger.info("Clearing Murf context: %s", context_id)
+            await self.websocket.send(_dumps(clear_msg))
             
             # Use the recv lock to prevent concurrency issues
             async with self._recv_lock:
                 try:
                     response = await asyncio.wait_for(self.websocket.recv(), timeout=3.0)
-                    data = json.loads(response)
-                    logger.info(f"Context clear response for {context_id}: {data}")
+                    data = orjson.loads(response)
+                    logger.info("Context clear response for %s: %s", context_id, data)
                 except asyncio.TimeoutError:
-                    logger.warning(f"Timeout waiting for context clear acknowledgment for {context_id}")
+                    logger.warning("Timeout waiting for context clear acknowledgment for %s", context_id)
             
             # Remove from active contexts
             self.active_contexts.discard(context_id)
@@ -426,12 +470,12 @@ class MurfWebSocketService:
                 self.current_context_id = None
             
         except Exception as e:
-            logger.error(f"Error clearing context {context_id}: {str(e)}")
+            logger.error("Error clearing context %s: %s", context_id, e)
             # Don't raise here - clearing context is best effort
     
     async def _clear_all_contexts(self):
         """Clear all active contexts"""
-        logger.info(f"Clearing all {len(self.active_contexts)} active contexts")
+        logger.info("Clearing all %s active contexts", len(self.active_contexts))
         
         # Use a copy of the set to avoid modification during iteration
         contexts_to_clear = list(self.active_contexts)
@@ -440,7 +484,7 @@ class MurfWebSocketService:
             try:
                 await self._clear_specific_context(context_id)
             except Exception as e:
-                logger.warning(f"Failed to clear context {context_id}: {e}")
+                logger.warning("Failed to clear context %s: %s", context_id, e)
                 # Remove from tracking even if clear failed
                 self.active_contexts.discard(context_id)
         
@@ -1,9 +1,11 @@
+import asyncio
 import assemblyai as aai
-import tempfile
-import os
+import io
 from typing import Optional
 import logging
 
+from utils.upstream import assemblyai_guard
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,31 +16,29 @@ class STTService:
         self.transcriber = aai.Transcriber()
     
     async def transcribe_audio(self, audio_content: bytes) -> Optional[str]:
-        tmp_path = None
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-                tmp.write(audio_content)
-                tmp_path = tmp.name
-            
-            transcript = self.transcriber.transcribe(tmp_path)
-            
-            if transcript.status == aai.TranscriptStatus.error:
-                raise Exception(f"AssemblyAI transcription error: {transcript.error}")
-            
-            if not transcript.text or transcript.text.strip() == "":
-                logger.warning("No speech detected in audio")
-                return None
-            
-            transcribed_text = transcript.text.strip()
-            logger.info(f"Successfully transcribed: {transcribed_text[:100]}...")
-            return transcribed_text
+            # Hand the SDK an in-memory buffer instead of round-tripping through a temp file;
+            # it uploads, transcribes and polls synchronously, so keep it off the event loop
+            async with assemblyai_guard:
+                return await asyncio.to_thread(self._transcribe_source, io.BytesIO(audio_content))
             
         except Exception as e:
             logger.error(f"STT transcription error: {str(e)}")
             raise
-        finally:
-            if tmp_path:
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    logger.warning(f"Failed to delete temporary file: {tmp_path}")
+    
+    def _transcribe_source(self, audio_source) -> Optional[str]:
+        transcript = self.transcriber.transcribe(audio_source)
+        
+        if transcript.status == aai.TranscriptStatus.error:
+            raise Exception(f"AssemblyAI transcription error: {transcript.error}")
+        
+        return self._clean_transcript_text(transcript.text)
+    
+    def _clean_transcript_text(self, text: Optional[str]) -> Optional[str]:
+        if not text or text.strip() == "":
+            logger.warning("No speech detected in audio")
+            return None
+        
+        transcribed_text = text.strip()
+        logger.info(f"Successfully transcribed: {transcribed_text[:100]}...")
+        return transcribed_text
@@ -1,51 +1,134 @@
-from murf import Murf
+from murf import AsyncMurf
+from collections import deque
+from functools import lru_cache
 from typing import Optional
+import asyncio
+import hashlib
+import httpx
 import logging
+import re
+
+from models.schemas import ErrorType
+from utils.cache import SingleFlight, TTLCache
+from utils.constants import FALLBACK_MESSAGES, get_fallback_message
+from utils.upstream import murf_guard
 
 logger = logging.getLogger(__name__)
 
+# Audio URLs already issued by Murf, keyed by (voice, format, text)
+_speech_cache = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+# Identical requests made while a synthesis is still running wait for it instead of starting another
+_speech_inflight = SingleFlight()
+
+# Requests arriving within this window are sent to Murf together, identical texts only once
+TTS_BATCH_WINDOW = 0.01
+TTS_BATCH_MAX_SIZE = 16
+
+# Last sentence terminator in a string, found in one scan
+_LAST_SENTENCE_END_RE = re.compile(r"[.!?][^.!?]*\Z")
+
+
+def _speech_cache_key(voice_id: str, format: str, text: str) -> str:
+    return hashlib.sha1(f"{voice_id}\0{format}\0{text}".encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=256)
+def _truncate_text_for_murf(text: str, max_chars: int) -> str:
+    # Memoised: fallback messages and repeated replies skip the scan entirely
+    if len(text) <= max_chars:
+        return text
+        
+    truncated = text[:max_chars]
+    match = _LAST_SENTENCE_END_RE.search(truncated)
+    last_sentence_end = match.start() if match else -1
+    
+    if last_sentence_end > max_chars * 0.7:
+        return truncated[:last_sentence_end + 1]
+    else:
+        last_space = truncated.rfind(' ')
+        if last_space > 0:
+            return truncated[:last_space] + "..."
+        else:
+            return truncated + "..."
+
+
+@lru_cache(maxsize=4)
+def get_murf_client(api_key: str, http_client: Optional[httpx.AsyncClient] = None) -> AsyncMurf:
+    """Shared AsyncMurf client per API key, so re-created services keep the same client"""
+    return AsyncMurf(api_key=api_key, httpx_client=http_client)
+
 
 class TTSService:
-    def __init__(self, api_key: str, voice_id: str = "en-IN-aarav"):
+    def __init__(self, api_key: str, voice_id: str = "en-IN-aarav", http_client: Optional[httpx.AsyncClient] = None):
         self.api_key = api_key
         self.voice_id = voice_id
-        self.client = Murf(api_key=api_key)
+        # Reuse the application's pooled HTTP client so Murf calls don't block the event loop
+        self.client = get_murf_client(api_key, http_client)
+        # Pending (cache_key, text, format, future) requests for the micro-batcher
+        self._pending = deque()
+        self._batcher: Optional[asyncio.Task] = None
+        self._fallback_task: Optional[asyncio.Task] = None
     
     def truncate_text_for_murf(self, text: str, max_chars: int = 3000) -> str:
-        if len(text) <= max_chars:
-            return text
-            
-        truncated = text[:max_chars]
-        last_sentence_end = max(
-            truncated.rfind('.'),
-            truncated.rfind('!'),
-            truncated.rfind('?')
-        )
-        
-        if last_sentence_end > max_chars * 0.7:
-            return truncated[:last_sentence_end + 1]
-        else:
-            last_space = truncated.rfind(' ')
-            if last_space > 0:
-                return truncated[:last_space] + "..."
-            else:
-                return truncated + "..."
+        return _truncate_text_for_murf(text, max_chars)
     
     async def generate_speech(self, text: str, format: str = "MP3") -> Optional[str]:
+        cache_key = _speech_cache_key(self.voice_id, format, text)
+        cached_url = _speech_cache.get(cache_key)
+        if cached_url:
+            logger.info("TTS audio served from cache")
+            return cached_url
+        
+        return await _speech_inflight.do(cache_key, lambda: self._enqueue(cache_key, text, format))
+    
+    async def _enqueue(self, cache_key: str, text: str, format: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((cache_key, text, format, future))
+        if self._batcher is None or self._batcher.done():
+            self._batcher = asyncio.create_task(self._run_batcher())
+        return await future
+    
+    async def _run_batcher(self):
+        """Drain queued requests every TTS_BATCH_WINDOW and synthesise each distinct text once"""
+        while self._pending:
+            await asyncio.sleep(TTS_BATCH_WINDOW)
+            
+            batch = {}
+            while self._pending and len(batch) < TTS_BATCH_MAX_SIZE:
+                cache_key, text, format, future = self._pending.popleft()
+                batch.setdefault(cache_key, (text, format, []))[2].append(future)
+            
+            results = await asyncio.gather(
+                *(self._synthesize(cache_key, text, format) for cache_key, (text, format, _) in batch.items()),
+                return_exceptions=True
+            )
+            
+            for (_, _, futures), result in zip(batch.values(), results):
+                for future in futures:
+                    if future.done():
+                        continue
+                    if isinstance(result, BaseException):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+    
+    async def _synthesize(self, cache_key: str, text: str, format: str) -> str:
         try:
             murf_text = self.truncate_text_for_murf(text)
             
-            murf_response = self.client.text_to_speech.generate(
-                text=murf_text,
-                voice_id=self.voice_id,
-                format=format
-            )
+            async with murf_guard:
+                murf_response = await self.client.text_to_speech.generate(
+                    text=murf_text,
+                    voice_id=self.voice_id,
+                    format=format
+                )
             
             audio_url = murf_response.audio_file
             
             if not audio_url:
                 raise Exception("No audio URL returned from Murf API")
-                
+            
+            _speech_cache.set(cache_key, audio_url)
             logger.info("TTS audio generated successfully")
             return audio_url
             
@@ -59,3 +142,18 @@ class TTSService:
         except Exception as e:
             logger.error(f"Failed to generate fallback audio: {str(e)}")
             return None
+    
+    def start_fallback_pregeneration(self):
+        """Synthesise the fixed FALLBACK_MESSAGES in the background so error paths never wait on Murf"""
+        if self._fallback_task is None:
+            self._fallback_task = asyncio.create_task(self._pregenerate_fallback_audio())
+    
+    async def _pregenerate_fallback_audio(self):
+        messages = list(FALLBACK_MESSAGES.values())
+        results = await asyncio.gather(*(self.generate_speech(m) for m in messages), return_exceptions=True)
+        generated = sum(1 for result in results if isinstance(result, str))
+        logger.info(f"[TTS] Pregenerated fallback audio for {generated}/{len(messages)} messages")
+    
+    def get_fallback_audio_url(self, error_type: ErrorType) -> Optional[str]:
+        """Audio URL for a fixed fallback message if it is already synthesised; never calls Murf"""
+        return _speech_cache.get(_speech_cache_key(self.voice_id, "MP3", get_fallback_message(error_type)))
@@ -1,31 +1,64 @@
-from tavily import TavilyClient
 from typing import List, Dict, Optional
+import httpx
 import logging
 
+from utils.cache import SingleFlight, TTLCache
+from utils.upstream import tavily_guard
+
 logger = logging.getLogger(__name__)
 
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+
+# Search results keyed by normalised query; short-lived so answers about current events stay fresh
+_search_cache = TTLCache(maxsize=1024, ttl=5 * 60)
+# The same query searched concurrently (e.g. by several users) shares one Tavily call
+_search_inflight = SingleFlight()
+
+
+def _search_cache_key(query: str, max_results: int) -> tuple:
+    return (" ".join(query.lower().split()), max_results)
+
 
 class WebSearchService:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, http_client: httpx.AsyncClient):
         self.api_key = api_key
-        self.client = TavilyClient(api_key=api_key)
+        # Keep-alive connection pool shared with the rest of the app
+        self.http_client = http_client
         logger.info("🔍 Web Search Service initialized with Tavily")
     
     async def search_web(self, query: str, max_results: int = 3) -> List[Dict]:
         """
         Search the web using Tavily API and return top results
         """
+        cache_key = _search_cache_key(query, max_results)
+        cached_results = _search_cache.get(cache_key)
+        if cached_results is not None:
+            logger.info(f"🔍 Web search served from cache for: '{query}'")
+            return cached_results
+        
+        search_results = await _search_inflight.do(cache_key, lambda: self._search(query, max_results))
+        _search_cache.set(cache_key, search_results)
+        return search_results
+    
+    async def _search(self, query: str, max_results: int) -> List[Dict]:
         try:
             logger.info(f"🔍 Searching web for: '{query}' (max_results: {max_results})")
             
             # Use Tavily search API
-            response = self.client.search(
-                query=query,
-                search_depth="basic",  # Can be "basic" or "advanced"
-                max_results=max_results,
-                include_answer=False,  # We don't want the AI-generated answer
-                include_raw_content=False  # We don't need raw content
-            )
+            async with tavily_guard:
+                http_response = await self.http_client.post(
+                    TAVILY_SEARCH_URL,
+                    json={
+                        "api_key": self.api_key,
+                        "query": query,
+                        "search_depth": "basic",  # Can be "basic" or "advanced"
+                        "max_results": max_results,
+                        "include_answer": False,  # We don't want the AI-generated answer
+                        "include_raw_content": False  # We don't need raw content
+                    }
+                )
+                http_response.raise_for_status()
+            response = http_response.json()
             
             search_results = []
             
@@ -81,4 +114,4 @@ class WebSearchService:
     
     def is_configured(self) -> bool:
         """Check if web search service is properly configured"""
-        return bool(self.api_key and self.client)
+        return bool(self.api_key and self.http_client)
@@ -9,6 +9,8 @@ document.addEventListener("DOMContentLoaded", function () {
   let isStreaming = false; // Track streaming state
   let allSessions = []; // Store all sessions
   let webSearchEnabled = false; // Track web search mode
+  const wsTextDecoder = new TextDecoder(); // Decodes binary JSON frames from the server
+  const AUDIO_FRAME_MARKER = 0x01; // First byte of binary TTS audio frames (JSON frames start with "{")
 
   // DOM elements
   const toggleChatHistoryBtn = document.getElementById("toggleChatHistory");
@@ -915,6 +917,8 @@ document.addEventListener("DOMContentLoaded", function () {
       const wsHost = isLocalhost ? `${window.location.hostname}:8000` : window.location.host;
       const wsUrl = `${wsProtocol}://${wsHost}/ws/audio-stream?session_id=${sessionId}`;
       audioStreamSocket = new WebSocket(wsUrl);
+      // The server sends its JSON messages as binary frames
+      audioStreamSocket.binaryType = "arraybuffer";
 
       // Set a connection timeout
       const connectionTimeout = setTimeout(() => {
@@ -970,7 +974,16 @@ document.addEventListener("DOMContentLoaded", function () {
       };
 
       audioStreamSocket.onmessage = function (event) {
-        const data = JSON.parse(event.data);
+        if (typeof event.data !== "string" && isAudioFrame(event.data)) {
+          handleAudioChunk(parseAudioFrame(event.data));
+          return;
+        }
+
+        const data = JSON.parse(
+          typeof event.data === "string"
+            ? event.data
+            : wsTextDecoder.decode(event.data)
+        );
 
         if (data.type === "audio_stream_ready") {
           updateStreamingStatus(
@@ -1685,6 +1698,20 @@ document.addEventListener("DOMContentLoaded", function () {
     }
   }
 
+  function isAudioFrame(buffer) {
+    return buffer.byteLength > 0 && new Uint8Array(buffer, 0, 1)[0] === AUDIO_FRAME_MARKER;
+  }
+
+  // Binary audio frame: [marker][u32 LE header length][JSON header][raw PCM]
+  function parseAudioFrame(buffer) {
+    const headerLength = new DataView(buffer).getUint32(1, true);
+    const header = JSON.parse(
+      wsTextDecoder.decode(new Uint8Array(buffer, 5, headerLength))
+    );
+    header.audio_bytes = new Uint8Array(buffer, 5 + headerLength);
+    return header;
+  }
+
   function handleAudioChunk(audioData) {
     // Stop any currently playing HTML5 Audio element before starting WebSocket streaming
     if (currentAudioElement) {
@@ -1699,7 +1726,7 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 
     // Play the audio chunk for streaming
-    playAudioChunk(audioData.audio_base64);
+    playAudioChunk(audioData.audio_bytes || audioData.audio_base64);
 
     // Remove the audio chunk received message as requested
 
@@ -2070,27 +2097,36 @@ document.addEventListener("DOMContentLoaded", function () {
       }
       
       let binary = atob(base64);
+      const byteArray = new Uint8Array(binary.length);
+
+      for (let i = 0; i < byteArray.length; i++) {
+        byteArray[i] = binary.charCodeAt(i);
+      }
+
+      return pcmBytesToFloat32(byteArray);
+    } catch (error) {
+      console.error("Error converting base64 to PCM:", error);
+      return null;
+    }
+  }
+
+  // Raw 16-bit little-endian PCM (as sent in binary audio frames) to Float32 samples
+  function pcmBytesToFloat32(bytes) {
+    try {
       const offset = wavHeaderSet ? 44 : 0; // Skip WAV header if present
 
       if (wavHeaderSet) {
         wavHeaderSet = false; // Only process header once per session
       }
 
-      const length = binary.length - offset;
+      const length = bytes.byteLength - offset;
       if (length <= 0) {
         console.warn("Invalid audio data length after offset");
         return null;
       }
-      
-      const buffer = new ArrayBuffer(length);
-      const byteArray = new Uint8Array(buffer);
-
-      for (let i = 0; i < byteArray.length; i++) {
-        byteArray[i] = binary.charCodeAt(i + offset);
-      }
 
-      const view = new DataView(byteArray.buffer);
-      const sampleCount = byteArray.length / 2; // 16-bit samples
+      const view = new DataView(bytes.buffer, bytes.byteOffset + offset, length);
+      const sampleCount = Math.floor(length / 2); // 16-bit samples
       
       if (sampleCount === 0) {
         console.warn("No audio samples found");
@@ -2106,7 +2142,7 @@ document.addEventListener("DOMContentLoaded", function () {
 
       return float32Array;
     } catch (error) {
-      console.error("Error converting base64 to PCM:", error);
+      console.error("Error converting PCM bytes to samples:", error);
       return null;
     }
   }
@@ -2189,7 +2225,7 @@ document.addEventListener("DOMContentLoaded", function () {
     }
   }
 
-  function playAudioChunk(base64Audio) {
+  function playAudioChunk(audio) {
     try {
       // Initialize audio context if not already done
       if (!initializeAudioContext()) {
@@ -2200,8 +2236,11 @@ document.addEventListener("DOMContentLoaded", function () {
       // Show audio playback indicator
       showAudioPlaybackIndicator();
 
-      // Convert base64 to PCM data
-      const float32Array = base64ToPCMFloat32(base64Audio);
+      // Convert raw PCM bytes (binary frames) or base64 to Float32 samples
+      const float32Array =
+        typeof audio === "string"
+          ? base64ToPCMFloat32(audio)
+          : pcmBytesToFloat32(audio);
       if (!float32Array || float32Array.length === 0) {
         console.warn("Invalid audio data received");
         return;
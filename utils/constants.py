@@ -1,5 +1,11 @@
 from models.schemas import ErrorType
 
+# Number of most recent messages given to the LLM as conversation context
+HISTORY_CONTEXT_LIMIT = 10
+
+# Most messages kept per session, in MongoDB and in the in-memory fallback store
+MAX_STORED_MESSAGES = 200
+
 FALLBACK_MESSAGES = {
     ErrorType.STT_ERROR: "I'm having trouble understanding your audio right now. Please try speaking again clearly into your microphone.",
     ErrorType.LLM_ERROR: "I'm experiencing some technical difficulties with my thinking process. Please try again in a moment.",
@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class BackgroundFileWriter:
+    """Append bytes to a file from a worker thread, so the event loop never waits on the disk
+
+    Usage:
+        writer = BackgroundFileWriter(path)
+        writer.write(chunk)      # returns immediately
+        await writer.close()     # flushes what is left, then closes the file
+    """
+
+    def __init__(self, path: str):
+        # Whatever arrives while a write is running is merged into the next one
+        self._buffer = bytearray()
+        self._ready = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run(path))
+
+    def write(self, data: bytes):
+        if self._task.done():
+            return  # the file could not be opened or written; don't buffer forever
+        self._buffer += data
+        self._ready.set()
+
+    async def _run(self, path: str):
+        fd = await asyncio.to_thread(os.open, path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                if self._buffer:
+                    data = bytes(self._buffer)
+                    self._buffer.clear()
+                    await asyncio.to_thread(_write_all, fd, data)
+                if self._closing and not self._buffer:
+                    return
+        finally:
+            os.close(fd)
+
+    async def close(self):
+        """Write out anything still buffered and close the file"""
+        self._closing = True
+        self._ready.set()
+        await self._task
@@ -0,0 +1,6 @@
+from uvicorn.workers import UvicornWorker
+
+
+class UvloopHttptoolsWorker(UvicornWorker):
+    """UvicornWorker pinned to uvloop and httptools, so a missing extra fails at boot instead of silently falling back"""
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
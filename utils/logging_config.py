@@ -1,7 +1,17 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 from datetime import datetime
 
+from utils.settings import settings
+
+# Records are handed to a background thread so stdout/file writes never block the event loop
+_listener: logging.handlers.QueueListener = None
+_queue_handler: logging.handlers.QueueHandler = None
+
 
 def setup_logging() -> logging.Logger:
     formatter = logging.Formatter(
@@ -9,26 +19,71 @@ def setup_logging() -> logging.Logger:
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     
+    # LOG_LEVEL=DEBUG for troubleshooting; debug calls are skipped cheaply at the default INFO
+    log_level = settings.log_level
+    
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    root_logger.setLevel(log_level)
     
     root_logger.handlers.clear()
+    stop_logging()
     
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(log_level)
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    handlers = [console_handler]
     
+    file_error = None
     try:
         file_handler = logging.FileHandler('voice_agent.log')
         file_handler.setLevel(logging.ERROR)
         file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
+        handlers.append(file_handler)
     except Exception as e:
-        print(f"Warning: Could not create log file: {e}")
+        file_error = e
+    
+    global _queue_handler
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root_logger.addHandler(_queue_handler)
+    _start_listener(log_queue, handlers)
+    
+    if file_error is not None:
+        root_logger.warning("Could not create log file: %s", file_error)
     
     return root_logger
 
 
+def _start_listener(log_queue, handlers) -> None:
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_after_fork() -> None:
+    # The listener thread does not survive fork (e.g. gunicorn --preload); give each worker its own,
+    # on a fresh queue so records the parent had not drained yet are not written twice
+    if _listener is not None and _queue_handler is not None:
+        log_queue = queue.SimpleQueue()
+        _queue_handler.queue = log_queue
+        _start_listener(log_queue, _listener.handlers)
+
+
+def stop_logging() -> None:
+    """Flush queued log records and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        try:
+            listener.stop()
+        except Exception:
+            pass
+
+
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
 def get_logger(name: str) -> logging.Logger:
     return logging.getLogger(name)
@@ -0,0 +1,26 @@
+from fastapi.responses import ORJSONResponse
+
+
+class MaxBodySizeMiddleware:
+    """Reject requests whose declared Content-Length exceeds `max_bytes` before any body is read
+
+    Plain ASGI rather than BaseHTTPMiddleware so streamed responses and WebSockets pass straight through.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_bytes:
+                        response = ORJSONResponse(
+                            {"detail": f"Request body too large (limit is {self.max_bytes} bytes)"},
+                            status_code=413
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
@@ -0,0 +1,59 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RuntimeError(f"Environment variable {name} must be an integer, got {value!r}")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Process configuration, read from the environment (and .env) once at import"""
+    mongodb_url: Optional[str]
+    log_level: str
+    host: str
+    port: int
+    web_concurrency: int
+    reload: bool
+    serve_static: bool
+    record_streamed_audio: bool
+    max_upload_bytes: int
+
+
+def load_settings() -> Settings:
+    load_dotenv()
+    settings = Settings(
+        mongodb_url=os.getenv("MONGODB_URL"),
+        log_level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=_env_int("PORT", 8000),
+        web_concurrency=_env_int("WEB_CONCURRENCY", 1),
+        reload=_env_bool("RELOAD", True),
+        serve_static=_env_bool("SERVE_STATIC", True),
+        record_streamed_audio=_env_bool("RECORD_STREAMED_AUDIO", False),
+        max_upload_bytes=_env_int("MAX_UPLOAD_BYTES", 25 * 1024 * 1024)
+    )
+
+    # Fail at startup rather than on the first request that depends on a bad value
+    if settings.web_concurrency < 1:
+        raise RuntimeError("WEB_CONCURRENCY must be at least 1")
+    if settings.max_upload_bytes <= 0:
+        raise RuntimeError("MAX_UPLOAD_BYTES must be a positive number of bytes")
+
+    return settings
+
+
+settings = load_settings()
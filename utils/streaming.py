@@ -0,0 +1,56 @@
+import asyncio
+from typing import AsyncIterator, Generic, TypeVar
+
+T = TypeVar("T")
+
+_STREAM_END = object()
+
+
+class _StreamError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class PrefetchedStream(Generic[T]):
+    """Drain an async iterator in a background task so the producer runs ahead of its consumer
+
+    Usage:
+        text_stream = PrefetchedStream(llm_service.generate_streaming_response(...))
+        await slow_setup()               # the LLM keeps streaming meanwhile
+        async for chunk in text_stream:  # buffered chunks come out first
+            ...
+    """
+
+    def __init__(self, source: AsyncIterator[T]):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[T]):
+        try:
+            async for item in source:
+                self._queue.put_nowait(item)
+        except Exception as e:
+            self._queue.put_nowait(_StreamError(e))
+        finally:
+            self._queue.put_nowait(_STREAM_END)
+
+    def __aiter__(self) -> AsyncIterator[T]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[T]:
+        while True:
+            item = await self._queue.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, _StreamError):
+                raise item.error
+            yield item
+
+    async def aclose(self):
+        """Stop the producer if it is still running and wait for it to unwind"""
+        if not self._task.done():
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised when an upstream's circuit breaker is open"""
+
+
+class UpstreamGuard:
+    """Caps concurrent calls to one upstream API and trips a breaker after repeated failures
+
+    Usage:
+        async with murf_guard:
+            await client.text_to_speech.generate(...)
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 20, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_concurrency = max_concurrency
+        # Created on first use so it binds to the running event loop
+        self._semaphore = None
+        self._consecutive_failures = 0
+        self._opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        if self._opened_at is None:
+            return False
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            # Half-open: let calls through again, a single failure re-opens the breaker
+            self._opened_at = None
+            self._consecutive_failures = self.failure_threshold - 1
+            return False
+        return True
+
+    async def __aenter__(self):
+        if self.is_open:
+            raise UpstreamUnavailableError(f"{self.name} is temporarily unavailable, please try again shortly")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        await self._semaphore.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        if exc_type is None:
+            self._consecutive_failures = 0
+        elif issubclass(exc_type, Exception):
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.failure_threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                logger.warning(f"[BREAKER] {self.name} circuit opened after {self._consecutive_failures} consecutive failures")
+        return False
+
+
+# One guard per third-party API, shared by every service instance in the process
+murf_guard = UpstreamGuard("Murf", max_concurrency=20)
+gemini_guard = UpstreamGuard("Gemini", max_concurrency=10)
+assemblyai_guard = UpstreamGuard("AssemblyAI", max_concurrency=20)
+tavily_guard = UpstreamGuard("Tavily", max_concurrency=10)
@@ -0,0 +1,15 @@
+import struct
+
+import orjson
+
+# TTS audio goes to the browser as raw PCM in binary frames instead of base64 inside JSON:
+#   [AUDIO_FRAME_MARKER][u32 little-endian header length][JSON header][audio bytes]
+# Every other message is a JSON object, so its frames start with "{" and can't be mistaken for audio.
+AUDIO_FRAME_MARKER = 0x01
+_AUDIO_FRAME_PREFIX = struct.Struct("<BI")
+
+
+def tts_audio_frame(header: dict, audio: bytes) -> bytes:
+    """Build a binary audio frame carrying `audio` with `header` as its metadata"""
+    header_json = orjson.dumps(header)
+    return b"".join((_AUDIO_FRAME_PREFIX.pack(AUDIO_FRAME_MARKER, len(header_json)), header_json, audio))